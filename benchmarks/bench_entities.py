@@ -0,0 +1,76 @@
+import os, sys, time, tracemalloc
+# python benchmarks/bench_entities.py [tree_root]
+# Per mob update cost and memory with 500 mobs on a synthetic floor. Passing the root of another checkout
+# (for example a git worktree of an older commit) runs the same measurement against that tree for a before/after comparison
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+ROOT = os.path.abspath(sys.argv[1]) if __name__ == "__main__" and len(sys.argv) > 1 else os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from game import Game
+from scripts.level import *
+from scripts.tile_grid import *
+from scripts.level_format import write_binary_level
+
+BENCH_LEVEL = "_bench_mobs"
+MOB_COUNT = 500
+TICKS = 300
+BLOCK_TICKS = 30
+
+def write_mob_level():
+    """A long floor with MOB_COUNT mobs on it, one Ba for every nine mushrooms, the player in the middle"""
+    width = MOB_COUNT * 4 + 40
+    grid = Tile_grid()
+    dirt, mushroom, ba = element_id("tiles", "dirt"), element_id("entities", "mushroom"), element_id("entities", "ba")
+    for x in range(width):
+        for y in range(20, 24):
+            grid.set(x, y, dirt, 1)
+    for index in range(MOB_COUNT):
+        x = 30 + index * 4
+        if index % 10 == 9:
+            grid.set(x, 15, ba)
+        else:
+            grid.set(x, 19, mushroom)
+    grid.set(width // 2, 19, element_id("utils", "player_spawner"))
+    layer = {"collision": True, "visible": True, "off_grid": {}, "grid": grid}
+    write_binary_level("levels/" + BENCH_LEVEL, [layer], [], {"top": 0, "bottom": 30, "left": 0, "right": width}, (width // 2, 19))
+
+
+if __name__ == "__main__":
+    game = Game()
+    write_mob_level()
+    try:
+        tracemalloc.start()
+        level = Level(game, BENCH_LEVEL)
+        before = tracemalloc.get_traced_memory()[0]
+        mob_class = type(level.enemy_list[0])
+        mobs = [mob_class(game, level, (0, 0), level.enemy_list[0].entity_name, level.player) for _ in range(MOB_COUNT)]
+        mob_bytes = (tracemalloc.get_traced_memory()[0] - before) / MOB_COUNT
+        tracemalloc.stop()
+        del mobs
+
+        enemies = level.enemy_list
+        # Best block of ticks, the first ones also pay for the level geometry getting built
+        elapsed = None
+        for block in range(TICKS // BLOCK_TICKS):
+            start = time.perf_counter()
+            for tick in range(BLOCK_TICKS):
+                for enemy in enemies:
+                    enemy.update()
+            block_time = (time.perf_counter() - start) / BLOCK_TICKS
+            elapsed = block_time if elapsed is None else min(elapsed, block_time)
+        print(f"{ROOT}: {len(enemies)} mobs, {elapsed * 1000:.2f} ms per tick, {elapsed / len(enemies) * 1e6:.2f} us per mob update, {mob_bytes:.0f} bytes per mob")
+
+        # Whole Level.update ticks with every mob simulated and with the mobs away from the view asleep
+        if hasattr(level, "simulation_margin"):
+            for margin in (None, SIMULATION_MARGIN):
+                level.simulation_margin = margin
+                start = time.perf_counter()
+                for tick in range(TICKS):
+                    level.update()
+                elapsed = (time.perf_counter() - start) / TICKS
+                print(f"  Level.update, simulation margin {margin}: {elapsed * 1000:.2f} ms per tick, {len(level.awake_enemies)} mobs awake")
+    finally:
+        os.remove("levels/" + BENCH_LEVEL)
+    pygame.quit()
@@ -0,0 +1,112 @@
+import os, sys, time
+# python benchmarks/bench_level_load.py [level_name ...]
+# Times the level baking work (tile chunk bakes + mob spawn discovery) reading every cell of the border rect against walking only
+# the occupied cells. Both sides run on the chunked Tile_grid, so this measures the iteration change alone, not the original "x;y" dict code
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from game import Game
+from scripts.level import Level, NO_SHOW_TILES
+from scripts.tile_grid import *
+from scripts.level_format import write_binary_level
+
+SYNTHETIC_LEVEL = "_bench_border_map"
+REPEATS = 5
+
+def dense_discovery(level):
+    """Every cell of the border rect in every layer, the loop shape of the old code but reading the Tile_grid"""
+    borders = level.tilemap.borders
+    spawns = []
+    for layer in level.tilemap.layer_list:
+        for x in range(borders["left"], borders["right"]):
+            for y in range(borders["top"], borders["bottom"]):
+                element_id = layer["grid"].get(x, y)
+                if element_id and element_name(element_id)[0] == "entities":
+                    spawns.append((x, y, element_id))
+    return spawns
+
+def sparse_discovery(level):
+    borders = level.tilemap.borders
+    spawns = []
+    for layer in level.tilemap.layer_list:
+        for x, y, element_id, variance in layer["grid"].tiles_in_rect(borders["left"], borders["top"], borders["right"], borders["bottom"]):
+            if element_name(element_id)[0] == "entities":
+                spawns.append((x, y, element_id))
+    return spawns
+
+def border_chunks(level):
+    borders = level.tilemap.borders
+    return [(chunk_x, chunk_y) for chunk_x in range(borders["left"] >> CHUNK_SHIFT, ((borders["right"] - 1) >> CHUNK_SHIFT) + 1)
+            for chunk_y in range(borders["top"] >> CHUNK_SHIFT, ((borders["bottom"] - 1) >> CHUNK_SHIFT) + 1)]
+
+def dense_bake(level):
+    """Bakes every chunk of the border rect by reading every cell like the old draw_tiles did, reading the Tile_grid"""
+    game, borders = level.game, level.tilemap.borders
+    surface = level.tile_surface.new_chunk_surface()
+    for key in border_chunks(level):
+        for layer in level.tilemap.layer_list:
+            for x in range(max(key[0] << CHUNK_SHIFT, borders["left"]), min((key[0] + 1) << CHUNK_SHIFT, borders["right"])):
+                for y in range(max(key[1] << CHUNK_SHIFT, borders["top"]), min((key[1] + 1) << CHUNK_SHIFT, borders["bottom"])):
+                    element_id = layer["grid"].get(x, y)
+                    if element_id:
+                        world_element_type, element = element_name(element_id)
+                        if element not in NO_SHOW_TILES and world_element_type != "entities":
+                            surface.blit(game.static_assets[f'{world_element_type}/{element}'][layer["grid"].get_variance(x, y)], ((x & CHUNK_MASK) * game.tile_size, (y & CHUNK_MASK) * game.tile_size))
+
+def sparse_bake(level):
+    surface = level.tile_surface.new_chunk_surface()
+    for key in border_chunks(level):
+        if level.tile_surface.chunk_has_content(key):
+            level.tile_surface.bake_chunk(key, surface)
+
+def best_of(function, level):
+    best = None
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        function(level)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+def write_synthetic_level(width = 1000, height = 200):
+    """A width x height border map with a floor, scattered platforms and a mob every 40 cells, mostly empty like real levels"""
+    grid = Tile_grid()
+    dirt, stone, mushroom = element_id("tiles", "dirt"), element_id("tiles", "castle_stone"), element_id("entities", "mushroom")
+    for x in range(width):
+        for y in range(height - 6, height):
+            grid.set(x, y, dirt, 4)
+        if x % 40 == 20:
+            grid.set(x, height - 7, mushroom)
+        if x % 25 < 6:
+            grid.set(x, height - 20 - (x // 25) % 60, stone)
+    grid.set(2, height - 7, element_id("utils", "player_spawner"))
+    layer = {"collision": True, "visible": True, "off_grid": {}, "grid": grid}
+    write_binary_level("levels/" + SYNTHETIC_LEVEL, [layer], [], {"top": 0, "bottom": height, "left": 0, "right": width}, (2, height - 7))
+
+
+if __name__ == "__main__":
+    game = Game()
+    names = sys.argv[1:] or ["level2", "level3", SYNTHETIC_LEVEL]
+    if SYNTHETIC_LEVEL in names:
+        write_synthetic_level()
+    try:
+        print(f"{'level':<20}{'border cells':>14}{'tiles':>8}{'load ms':>10}{'discover dense/sparse ms':>28}{'bake dense/sparse ms':>24}")
+        for name in names:
+            start = time.perf_counter()
+            level = Level(game, name)
+            load = (time.perf_counter() - start) * 1000
+            assert sorted(dense_discovery(level)) == sorted(sparse_discovery(level))
+            borders = level.tilemap.borders
+            border_cells = (borders["right"] - borders["left"]) * (borders["bottom"] - borders["top"])
+            tiles = sum(len(layer["grid"]) for layer in level.tilemap.layer_list)
+            discovery = f"{best_of(dense_discovery, level):.1f} / {best_of(sparse_discovery, level):.1f}"
+            bake = f"{best_of(dense_bake, level):.1f} / {best_of(sparse_bake, level):.1f}"
+            print(f"{name:<20}{border_cells:>14}{tiles:>8}{load:>10.1f}{discovery:>28}{bake:>24}")
+    finally:
+        if os.path.exists("levels/" + SYNTHETIC_LEVEL):
+            os.remove("levels/" + SYNTHETIC_LEVEL)
+    pygame.quit()
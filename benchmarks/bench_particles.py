@@ -0,0 +1,61 @@
+import os, sys, time, random
+# python benchmarks/bench_particles.py [particle_count ...]
+# Times the particle update with one object per particle (the old particle_list) against Particle_system, plus the full update + batched render cost on and off screen
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from scripts.particles import Particle_system, Render_batch
+
+FRAMES = 120
+
+class Object_particle:
+    """One death particle the way particle_list held them"""
+    def __init__(self, pos) -> None:
+        self.pos = pygame.math.Vector2(pos[0], pos[1])
+        self.velocity = pygame.math.Vector2(random.random() - 0.5, random.random() - 2)
+        self.radius = 5
+
+    def update(self):
+        self.velocity.y += 0.05
+        self.pos.x += self.velocity.x
+        self.pos.y += self.velocity.y
+        self.radius -= 0.05
+
+def object_frames(count):
+    particle_list = []
+    start = time.perf_counter()
+    for frame in range(FRAMES):
+        # Topping the list up with bursts of 50, like mob deaths
+        while len(particle_list) < count:
+            particle_list.extend(Object_particle((320, 180)) for _ in range(50))
+        for particle in particle_list.copy():
+            particle.update()
+            if particle.radius <= 0:
+                particle_list.remove(particle)
+    return (time.perf_counter() - start) / FRAMES * 1000
+
+def system_frames(count, surface = None, pos = (320, 180)):
+    particles = Particle_system(seed = 1)
+    batch = Render_batch((640, 360))
+    start = time.perf_counter()
+    for frame in range(FRAMES):
+        while len(particles) < count:
+            particles.death_burst(pos)
+        particles.update()
+        if surface is not None:
+            particles.render(batch, (0, 0))
+            batch.flush(surface)
+    return (time.perf_counter() - start) / FRAMES * 1000
+
+
+if __name__ == "__main__":
+    pygame.init()
+    surface = pygame.Surface((640, 360))
+    counts = [int(arg) for arg in sys.argv[1:]] or [500, 2000, 5000]
+    print(f"{'particles':>10}{'objects update ms':>20}{'system update ms':>20}{'system update+render ms':>26}{'offscreen ms':>14}")
+    for count in counts:
+        print(f"{count:>10}{object_frames(count):>20.2f}{system_frames(count):>20.2f}{system_frames(count, surface):>26.2f}{system_frames(count, surface, (-2000, 180)):>14.2f}")
+    pygame.quit()
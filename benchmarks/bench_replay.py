@@ -0,0 +1,47 @@
+import os, sys, time
+# python benchmarks/bench_replay.py [--record] [--render] [--workers n]
+# Replays the recordings in benchmarks/recordings headless across a process pool, reporting steps per second, p99 step time and
+# the high water marks of the projectile pools and particles, and failing when a replay doesn't end in its recorded state.
+# --record regenerates them from scripted inputs
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from scripts.replay import *
+
+RECORDINGS_PATH = "benchmarks/recordings"
+RECORDED_LEVELS = ["level1", "level2", "level3"]
+RECORDING_STEPS = 3600 # one minute of play each
+RECORDING_SEED = 1
+
+def record_scripted():
+    from game import Game
+    game = Game(headless = True)
+    os.makedirs(RECORDINGS_PATH, exist_ok = True)
+    for level_name in RECORDED_LEVELS:
+        level = Level(game, level_name, streaming = True, seed = RECORDING_SEED)
+        recording = Input_recording.start(level)
+        for inputs in scripted_inputs(RECORDING_SEED, RECORDING_STEPS):
+            level.step(inputs)
+        recording.finish(level)
+        recording.save(f"{RECORDINGS_PATH}/{level_name}.json")
+        print(f"{level_name}: {len(recording.inputs)} steps, {recording.final_state['game_end_state']}, player {recording.final_state['player']}")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--record" in args:
+        record_scripted()
+    workers = int(args[args.index("--workers") + 1]) if "--workers" in args else None
+    paths = [f"{RECORDINGS_PATH}/{name}" for name in sorted(os.listdir(RECORDINGS_PATH)) if name.endswith(".json")]
+    start = time.perf_counter()
+    results = run_batch(paths, workers, "--render" in args)
+    elapsed = time.perf_counter() - start
+    print(f"{'recording':>36}{'steps':>8}{'steps/s':>10}{'p99 ms':>9}{'pooled':>8}{'particles':>11}  state")
+    for result in results:
+        pools = result["pools"]
+        pooled = sum(stats["high_water"] for name, stats in pools.items() if name != "particles")
+        print(f"{result['recording']:>36}{result['steps']:>8}{result['steps_per_second']:>10.0f}{result['p99_ms']:>9.2f}{pooled:>8}{pools['particles']['high_water']:>11}  {'ok' if result['matches'] else 'MISMATCH'}")
+    print(f"{sum(result['steps'] for result in results) / elapsed:.0f} steps/s over the batch, worker start up included")
+    sys.exit(0 if all(result["matches"] for result in results) else 1)
@@ -0,0 +1,61 @@
+import os, sys, time
+# python benchmarks/bench_streaming.py
+# Plays binary copies of the levels with streaming on for scripted inputs, reporting steps per second and failing when the
+# streamed mobs go out of sync: a live mob outside the loaded chunks or two live mobs from one spawner. The copies are written
+# without a player spawn in their meta so the level has to find the spawner in the chunk records
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+from game import Game
+from scripts.replay import *
+from scripts.level_format import write_binary_level
+
+STREAMED_LEVELS = ["level1", "level2", "level3"]
+STREAMED_STEPS = 3600
+STREAMED_SEED = 1
+
+def write_streamed_copy(game, level_name):
+    """Binary copy of level_name with no spawn in its meta, returns the copy's name and the spawn of the original"""
+    tilemap = Tilemap(game, level_name)
+    copy_name = "_bench_stream_" + level_name
+    write_binary_level("levels/" + copy_name, tilemap.layer_list, tilemap.background_list, tilemap.borders, None)
+    return copy_name, tilemap.player_spawn
+
+def mob_problems(level):
+    tile_size = level.game.tile_size
+    problems = []
+    spawn_cells = [enemy.spawn_cell for enemy in level.enemy_list]
+    if len(set(spawn_cells)) != len(spawn_cells):
+        problems.append("two mobs from one spawner")
+    for enemy in level.enemy_list:
+        if chunk_key(int(enemy.rect.centerx // tile_size), int(enemy.rect.centery // tile_size)) not in level.tilemap.loaded_chunks:
+            problems.append(f"{type(enemy).__name__} at {tuple(enemy.rect.center)} outside the loaded chunks")
+    return problems
+
+def play_streamed(game, copy_name, spawn):
+    level = Level(game, copy_name, streaming = True, seed = STREAMED_SEED)
+    problems = [] if level.tilemap.player_spawn == spawn else [f"spawn {level.tilemap.player_spawn} instead of {spawn}"]
+    start = time.perf_counter()
+    for inputs in scripted_inputs(STREAMED_SEED, STREAMED_STEPS):
+        level.step(inputs)
+        problems.extend(mob_problems(level))
+        if problems:
+            break
+    return time.perf_counter() - start, problems
+
+
+if __name__ == "__main__":
+    game = Game(headless = True)
+    failed = False
+    print(f"{'level':>8}{'steps/s':>10}  state")
+    for level_name in STREAMED_LEVELS:
+        copy_name, spawn = write_streamed_copy(game, level_name)
+        try:
+            elapsed, problems = play_streamed(game, copy_name, spawn)
+        finally:
+            os.remove("levels/" + copy_name)
+        failed |= bool(problems)
+        print(f"{level_name:>8}{STREAMED_STEPS / elapsed:>10.0f}  {problems[0] if problems else 'ok'}")
+    sys.exit(1 if failed else 0)
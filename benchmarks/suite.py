@@ -0,0 +1,206 @@
+import os, sys, time, json, random, platform, tempfile, shutil
+# python benchmarks/suite.py [--filter text] [--repeats n] [--out results.json] [--save-baseline] [--compare [baseline.json]] [--tolerance 0.3]
+# Headless benchmarks of the engine hot paths, the best of a few repeats of each case is written as JSON.
+# --save-baseline stores the results as the baseline, --compare fails when a case got slower than the baseline by more than the tolerance
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.chdir(ROOT)
+
+import pygame
+from game import Game
+from scripts.level import *
+from scripts.tilemap import Tilemap
+from scripts.assets import Asset_atlas
+from scripts.level_format import write_binary_level
+from bench_level_load import SYNTHETIC_LEVEL, write_synthetic_level, sparse_bake
+from bench_entities import BENCH_LEVEL, write_mob_level
+
+RESULTS_PATH = "benchmarks/results.json"
+BASELINE_PATH = "benchmarks/baseline.json"
+REPEATS = 5
+TOLERANCE = 0.3 # slowdown over the baseline reported as a regression
+LEVELS = ["level1", "level2", "level3", SYNTHETIC_LEVEL]
+LOOKUPS = 10000
+MAX_SWEEP = 8 # fastest an entity moves in a step, its fall speed cap
+UPDATE_TICKS = 30
+PARTICLE_BURSTS = 20
+PARTICLE_FRAMES = 60
+
+def lookup_points(tilemap, count = LOOKUPS):
+    """Seeded points spread over the level borders"""
+    rng = random.Random(1)
+    borders, tile_size = tilemap.borders, tilemap.game.tile_size
+    return [(rng.uniform(borders["left"], borders["right"]) * tile_size, rng.uniform(borders["top"], borders["bottom"]) * tile_size) for _ in range(count)]
+
+def swept_rects(points, size = (32, 32)):
+    """Entity sized rects at points swept by a seeded velocity, the horizontal and the vertical one like Entity collision builds them"""
+    rng = random.Random(2)
+    rects = []
+    for x, y in points:
+        rect = pygame.Rect(x, y, *size)
+        velocity = (rng.uniform(-MAX_SWEEP, MAX_SWEEP), rng.uniform(-MAX_SWEEP, MAX_SWEEP))
+        rects.append(rect.union(rect.move(-velocity[0], 0)))
+        rects.append(rect.union(rect.move(0, -velocity[1])).inflate(0, 2))
+    return rects
+
+def tilemap_cases(game):
+    tilemap = Tilemap(game, "level2")
+    points = lookup_points(tilemap)
+    rects = swept_rects(points)
+    def solid_check():
+        for point in points:
+            tilemap.solid_check(point)
+    def static_geometry_query():
+        query = tilemap.static_geometry.query
+        for rect in rects:
+            query(rect)
+    yield f"tilemap/solid_check_{LOOKUPS}", solid_check
+    yield f"tilemap/static_geometry_query_{len(rects)}", static_geometry_query
+
+def level_update_cases(game):
+    # Updating moves the mobs and the player, so every repeat starts from a freshly loaded level
+    def fresh_level():
+        return Level(game, BENCH_LEVEL)
+    def update(level):
+        for _ in range(UPDATE_TICKS):
+            level.update()
+    def update_all(level):
+        level.simulation_margin = None
+        update(level)
+    mobs = len(fresh_level().enemy_list)
+    yield f"level/update_{mobs}_mobs_{UPDATE_TICKS}_ticks", update, fresh_level
+    yield f"level/update_{mobs}_mobs_all_awake_{UPDATE_TICKS}_ticks", update_all, fresh_level
+
+def particle_cases(game):
+    def bursts():
+        particles = Particle_system(seed = 1)
+        for burst in range(PARTICLE_BURSTS):
+            particles.death_burst((320, 180))
+        for frame in range(PARTICLE_FRAMES):
+            particles.update()
+    yield f"particles/{PARTICLE_BURSTS}_bursts_{PARTICLE_FRAMES}_frames", bursts
+
+def draw_tiles_cases(game):
+    for name in LEVELS:
+        level = Level(game, name)
+        yield f"level/draw_tiles/{name}", lambda level = level: sparse_bake(level)
+
+def tilemap_io_cases(game):
+    directory = tempfile.mkdtemp()
+    try:
+        for name in LEVELS:
+            tilemap = Tilemap(game, name)
+            binary = tilemap.binary
+            arguments = (tilemap.layer_list, tilemap.background_list, tilemap.borders, tilemap.player_spawn)
+            # A copy in the other format so both readers get measured
+            copy_path = os.path.join(directory, "copy_" + name)
+            if binary:
+                tilemap.export_json(copy_path)
+            else:
+                write_binary_level(copy_path, *arguments)
+            yield f"tilemap/load_{'binary' if binary else 'json'}/{name}", lambda name = name: Tilemap(game, name)
+            yield f"tilemap/load_{'json' if binary else 'binary'}/{name}", lambda name = name, copy_path = copy_path: Tilemap(game, name, path = copy_path)
+            yield f"tilemap/save_json/{name}", lambda tilemap = tilemap: tilemap.export_json(os.path.join(directory, "level"))
+            yield f"tilemap/save_binary/{name}", lambda arguments = arguments: write_binary_level(os.path.join(directory, "level"), *arguments)
+    finally:
+        shutil.rmtree(directory)
+
+def asset_cases(game):
+    def load_assets():
+        game.atlas = Asset_atlas()
+        game.load_entities_assets()
+        game.load_static_assets()
+    def build_atlas():
+        directory = tempfile.mkdtemp()
+        Asset_atlas(cache_path = directory)
+        shutil.rmtree(directory)
+    yield "game/load_assets_cached", load_assets
+    yield "game/build_atlas", build_atlas
+
+CASES = [tilemap_cases, level_update_cases, particle_cases, draw_tiles_cases, tilemap_io_cases, asset_cases]
+
+def measure(function, repeats, setup = None):
+    """Best and median milliseconds of function over repeats, with setup it gets a fresh setup() result each repeat, made outside the timing"""
+    times = []
+    for _ in range(repeats):
+        arguments = (setup(),) if setup else ()
+        start = time.perf_counter()
+        function(*arguments)
+        times.append((time.perf_counter() - start) * 1000)
+    times.sort()
+    return {"best_ms": times[0], "median_ms": times[len(times) // 2]}
+
+def run(game, name_filter = None, repeats = REPEATS):
+    results = {}
+    # Cases are generators so their setup and clean up wrap the measurements,
+    # cases that change what they measure also yield a setup run before every repeat
+    for cases in CASES:
+        for name, function, *setup in cases(game):
+            if name_filter and name_filter not in name:
+                continue
+            results[name] = measure(function, repeats, *setup)
+            print(f"{name:<55}{results[name]['best_ms']:>10.3f} ms")
+    return results
+
+def compare(results, baseline, tolerance = TOLERANCE):
+    """Prints every case against the baseline, returns the names of the ones slower by more than tolerance"""
+    regressions = []
+    print(f"\n{'case':<55}{'baseline ms':>12}{'now ms':>10}{'ratio':>8}")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name:<55}{'-':>12}{result['best_ms']:>10.3f}{'new':>8}")
+            continue
+        ratio = result["best_ms"] / baseline[name]["best_ms"] if baseline[name]["best_ms"] else 1
+        status = ""
+        if ratio > 1 + tolerance:
+            status = "  REGRESSION"
+            regressions.append(name)
+        elif ratio < 1 - tolerance:
+            status = "  faster"
+        print(f"{name:<55}{baseline[name]['best_ms']:>12.3f}{result['best_ms']:>10.3f}{ratio:>8.2f}{status}")
+    return regressions
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    def option(flag, default):
+        if flag in args:
+            index = args.index(flag)
+            if index + 1 < len(args) and not args[index + 1].startswith("--"):
+                return args[index + 1]
+        return default
+    name_filter = option("--filter", None)
+    repeats = int(option("--repeats", REPEATS))
+    out_path = option("--out", RESULTS_PATH)
+    tolerance = float(option("--tolerance", TOLERANCE))
+    baseline_path = option("--compare", BASELINE_PATH)
+
+    game = Game(headless = True)
+    write_synthetic_level()
+    write_mob_level()
+    try:
+        results = run(game, name_filter, repeats)
+    finally:
+        os.remove("levels/" + SYNTHETIC_LEVEL)
+        os.remove("levels/" + BENCH_LEVEL)
+    data = {"meta": {"time": time.strftime("%Y-%m-%d %H:%M:%S"), "python": platform.python_version(), "pygame": pygame.version.ver,
+                     "platform": platform.platform(), "repeats": repeats}, "results": results}
+    with open(out_path, "w") as file:
+        json.dump(data, file, indent = 1)
+    print(f"results written to {out_path}")
+    if "--save-baseline" in args:
+        with open(BASELINE_PATH, "w") as file:
+            json.dump(data, file, indent = 1)
+        print(f"baseline written to {BASELINE_PATH}")
+
+    failed = False
+    if "--compare" in args:
+        with open(baseline_path) as file:
+            regressions = compare(results, json.load(file)["results"], tolerance)
+        if regressions:
+            print(f"{len(regressions)} case(s) slower than the baseline by more than {tolerance:.0%}")
+            failed = True
+    pygame.quit()
+    sys.exit(1 if failed else 0)
@@ -1,38 +1,49 @@
-import pygame, sys, os, json
+import pygame, sys, os, json, time, random
 from scripts.editor import Editor
 from scripts.level import Level
 from scripts.menu import Menu
-# import ez_profile
+from scripts.assets import Asset_atlas, Frame_cache
+from scripts.replay import Input_recording
+from scripts.profiler import Profiler, Profiler_overlay
 
 
 class Game:
-    def __init__(self) -> None:
+    def __init__(self, headless = False, record_directory = None) -> None:
+        if headless:
+            # No window, the dummy video driver still hands out a display surface to draw on
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
         pygame.init()
         self.width = 1280
         self.height = 720
         self.display = pygame.display.set_mode((self.width,self.height))
         self.tile_size = 32
         self.clock = pygame.time.Clock()
+        # Timing scopes of the level and the editor, F3 shows the overlay and F4 exports them
+        self.profiler = Profiler()
+        self.profiler_overlay = Profiler_overlay(self.profiler)
+        # Levels played are recorded there for scripts/replay.py when set
+        self.record_directory = record_directory
+        # Every frame is a subsurface of one atlas image, cached on disk between launches
+        self.atlas = Asset_atlas()
         self.entities_assets = {}
         self.animations_speed_dict = {}
         self.draw_offset_dict = {}
         self.load_entities_assets()
+        # Mirrored frames of the left facing entities, so they aren't flipped again every frame
+        self.frame_cache = Frame_cache(self.entities_assets)
 
         self.static_assets = {}
+        self.icon_assets = {}
         self.load_static_assets()
 
         
 
     def load_entities_assets(self):
         path_entities = "assets/world_elements/entities"
+        self.entities_assets = self.atlas.entities_assets()
         for folder_element in os.listdir(path_entities):
-            path_element = path_entities + "/" + folder_element
-            for status_element in os.listdir(path_element):
-                if status_element == "config":
-                    self.load_entity_configs(path_element + "/" + status_element, folder_element)
-                    # print(folder_element)
-                else:
-                    self.entities_assets[folder_element + "/" + status_element] = self.load_images(path_element + "/" + status_element)
+            if os.path.exists(path_entities + "/" + folder_element + "/config"):
+                self.load_entity_configs(path_entities + "/" + folder_element + "/config", folder_element)
 
     def load_entity_configs(self, path, entity_name):
         file = open(path, 'r')
@@ -48,15 +59,9 @@ class Game:
 
 
     def load_static_assets(self):
-        path_world_elements = "assets/world_elements"
-        for folder_type in os.listdir(path_world_elements):
-            path_element = path_world_elements + "/" + folder_type
-            for folder_element in os.listdir(path_element):
-                full_path = path_element + "/" + folder_element
-                if folder_type == "tiles":
-                    self.static_assets[folder_type + "/" + folder_element] = self.load_images(full_path, True)
-                else: # if not tile, load icon folder may change later if we want to animate decor
-                    self.static_assets[folder_type + "/" + folder_element] = self.load_images(full_path + "/" + "icon")
+        # Tiles keep every variance, the other elements only their icon folder (may change later if we want to animate decor)
+        self.static_assets = self.atlas.static_assets()
+        self.icon_assets = self.atlas.icon_assets()
 
 
     def run(self):
@@ -73,20 +78,26 @@ class Game:
                     editor = Editor(self, level_name)
                     editor.run()
                 elif mode == "game":
-                    level = Level(self, level_name)
-                    level.run()
+                    self.play_level(level_name)
             elif result == "play":
                 # Handle play action (this will be updated when we add level selection)
-                level = Level(self, "level1")
-                level.run()
+                self.play_level("level1")
 
+    def play_level(self, level_name):
+        if self.record_directory is None:
+            # Binary levels are streamed around the player, json levels load whole
+            Level(self, level_name, streaming = True).run()
+            return
+        level = Level(self, level_name, streaming = True, seed = random.randrange(1 << 31))
+        recording = Input_recording.start(level)
+        level.run()
+        recording.finish(level)
+        os.makedirs(self.record_directory, exist_ok = True)
+        recording.save(os.path.join(self.record_directory, level_name + time.strftime("_%Y%m%d_%H%M%S.json")))
 
-    def load_images(self,path, is_tile = False):
-        images = []
-        for img_name in sorted(os.listdir(path)):
-            if not (is_tile and img_name == "icon"):
-                images.append(pygame.image.load(path + "/" + img_name).convert_alpha())
-        return images
 
-game = Game()
-game.run()
\ No newline at end of file
+if __name__ == "__main__":
+    # python game.py [--record directory]
+    record_directory = sys.argv[sys.argv.index("--record") + 1] if "--record" in sys.argv else None
+    game = Game(record_directory = record_directory)
+    game.run()
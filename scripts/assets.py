@@ -0,0 +1,124 @@
+import pygame, os, json, hashlib
+from collections import OrderedDict
+
+WORLD_ELEMENTS_PATH = "assets/world_elements"
+ASSET_CACHE_PATH = ".asset_cache"
+ATLAS_WIDTH = 1024
+FRAME_CACHE_SIZE = 512 # flipped frame variants kept, about one per animation frame
+
+def list_frames(path):
+    return [path + "/" + img_name for img_name in sorted(os.listdir(path)) if img_name.endswith(".png")]
+
+def scan_world_elements(root = WORLD_ELEMENTS_PATH):
+    """Returns the frame paths of every asset group, ({"mushroom/run": paths}, {"entities/mushroom": paths}, {"entities/mushroom": icon path})"""
+    entity_frames, static_frames, icon_frames = {}, {}, {}
+    for folder_type in sorted(os.listdir(root)):
+        path_type = root + "/" + folder_type
+        for folder_element in sorted(os.listdir(path_type)):
+            path_element = path_type + "/" + folder_element
+            if folder_type == "entities":
+                for status_element in sorted(os.listdir(path_element)):
+                    if status_element != "config":
+                        entity_frames[folder_element + "/" + status_element] = list_frames(path_element + "/" + status_element)
+            if folder_type == "tiles":
+                # The tile variances sit next to the icon folder
+                static_frames[folder_type + "/" + folder_element] = list_frames(path_element)
+            else:
+                static_frames[folder_type + "/" + folder_element] = list_frames(path_element + "/icon")
+            icon_frames[folder_type + "/" + folder_element] = path_element + "/icon/00.png"
+    return entity_frames, static_frames, icon_frames
+
+def source_signature(paths):
+    """Changes whenever a source png is added, removed or touched"""
+    digest = hashlib.sha1()
+    for path in paths:
+        stat = os.stat(path)
+        digest.update(f"{path}:{stat.st_mtime_ns}:{stat.st_size}\n".encode())
+    return digest.hexdigest()
+
+def pack_rects(sizes, width = ATLAS_WIDTH):
+    """Shelf packs {path: (w, h)}, tallest first, returns ({path: [x, y, w, h]}, atlas height)"""
+    rects = {}
+    x = y = shelf_height = 0
+    for path in sorted(sizes, key = lambda path: (-sizes[path][1], path)):
+        w, h = sizes[path]
+        if x + w > width:
+            x, y = 0, y + shelf_height
+            shelf_height = 0
+        rects[path] = [x, y, w, h]
+        x += w
+        shelf_height = max(shelf_height, h)
+    return rects, y + shelf_height
+
+
+class Asset_atlas:
+    """Every world element frame packed in one image, decoded once per launch and rebuilt only when a source png changes"""
+    def __init__(self, root = WORLD_ELEMENTS_PATH, cache_path = ASSET_CACHE_PATH) -> None:
+        self.entity_frames, self.static_frames, self.icon_frames = scan_world_elements(root)
+        paths = sorted({path for group in (self.entity_frames, self.static_frames) for frames in group.values() for path in frames} | set(self.icon_frames.values()))
+        self.signature = source_signature(paths)
+        self.image_path = cache_path + "/atlas.png"
+        self.index_path = cache_path + "/atlas.json"
+
+        index = self.read_index()
+        if index is not None and index["signature"] == self.signature and os.path.exists(self.image_path):
+            self.image = pygame.image.load(self.image_path).convert_alpha()
+            self.rects = index["rects"]
+        else:
+            self.build(paths, cache_path)
+        self.surfaces = {path: self.image.subsurface(rect) for path, rect in self.rects.items()}
+
+    def read_index(self):
+        try:
+            with open(self.index_path, "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def build(self, paths, cache_path):
+        images = {path: pygame.image.load(path).convert_alpha() for path in paths}
+        self.rects, height = pack_rects({path: image.get_size() for path, image in images.items()})
+        self.image = pygame.Surface((ATLAS_WIDTH, max(height, 1)), pygame.SRCALPHA)
+        for path, image in images.items():
+            # Max blending onto the cleared atlas copies the pixels as they are, alpha included
+            self.image.blit(image, self.rects[path][:2], special_flags = pygame.BLEND_RGBA_MAX)
+        try:
+            os.makedirs(cache_path, exist_ok = True)
+            pygame.image.save(self.image, self.image_path)
+            with open(self.index_path, "w") as file:
+                json.dump({"signature": self.signature, "rects": self.rects}, file)
+        except OSError:
+            # A read only checkout just rebuilds the atlas every launch
+            pass
+
+    def entities_assets(self):
+        return {key: [self.surfaces[path] for path in frames] for key, frames in self.entity_frames.items()}
+
+    def static_assets(self):
+        return {key: [self.surfaces[path] for path in frames] for key, frames in self.static_frames.items()}
+
+    def icon_assets(self):
+        return {key: self.surfaces[path] for key, path in self.icon_frames.items()}
+
+
+class Frame_cache:
+    """Flipped variants of animation frames, made on first use and evicted least recently used first"""
+    def __init__(self, frames, max_size = FRAME_CACHE_SIZE) -> None:
+        self.frames = frames
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def get(self, key, index, flip = False):
+        """Frame index of the frames[key] animation, mirrored horizontally when flip"""
+        if not flip:
+            return self.frames[key][index]
+        cache_key = (key, index)
+        surface = self.surfaces.get(cache_key)
+        if surface is not None:
+            self.surfaces.move_to_end(cache_key)
+            return surface
+        surface = pygame.transform.flip(self.frames[key][index], True, False)
+        self.surfaces[cache_key] = surface
+        if len(self.surfaces) > self.max_size:
+            self.surfaces.popitem(last = False)
+        return surface
@@ -0,0 +1,31 @@
+import pygame, math
+
+class Parallax_layer:
+    def __init__(self, image, factor) -> None:
+        # Converted once to the display format so blits don't convert pixels every frame
+        self.image = image.convert_alpha() if image.get_flags() & pygame.SRCALPHA else image.convert()
+        self.size = self.image.get_size()
+        self.factor = factor
+
+class Parallax_background:
+    """Layers of one image repeated in both directions and scrolled at a fraction of the camera, only the copies in view get blitted"""
+    def __init__(self) -> None:
+        self.layers = []
+
+    def add_layer(self, image, factor = (0.5, 0.5)):
+        """Adds a layer drawn over the previous ones, factor is how far it moves per pixel of camera scroll"""
+        layer = Parallax_layer(image, factor)
+        self.layers.append(layer)
+        return layer
+
+    def visible_tiles(self, layer, scroll, view_size):
+        width, height = layer.size
+        # Whole pixel offset of the layer so its copies line up without seams
+        left = -(math.floor(scroll[0] * layer.factor[0]) % width)
+        top = -(math.floor(scroll[1] * layer.factor[1]) % height)
+        return [(layer.image, (x, y)) for x in range(left, view_size[0], width) for y in range(top, view_size[1], height)]
+
+    def render(self, target, scroll):
+        view_size = target.get_size()
+        for layer in self.layers:
+            target.blits(self.visible_tiles(layer, scroll, view_size), doreturn = False)
@@ -0,0 +1,81 @@
+BROADPHASE_CELL_SIZE = 128 # pixels, a few tiles so most objects sit in one to four cells
+
+class Spatial_grid:
+    """Uniform grid broadphase, objects register a rect that is updated in place and get found by AABB queries"""
+    def __init__(self, cell_size = BROADPHASE_CELL_SIZE) -> None:
+        self.cell_size = cell_size
+        # cell -> {object: None}, a dict keeps the insertion order so queries come back in a stable order
+        self.cells = {}
+        # object -> (rect, cell range it is registered in)
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, obj):
+        return obj in self.entries
+
+    def cell_range(self, rect):
+        size = self.cell_size
+        # Empty rects cover no cells and can never be found
+        return rect.left // size, rect.top // size, (rect.right - 1) // size, (rect.bottom - 1) // size
+
+    def add_to_cells(self, obj, cell_range):
+        left, top, right, bottom = cell_range
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = self.cells.get((cell_x, cell_y))
+                if cell is None:
+                    cell = self.cells[(cell_x, cell_y)] = {}
+                cell[obj] = None
+
+    def remove_from_cells(self, obj, cell_range):
+        left, top, right, bottom = cell_range
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = self.cells[(cell_x, cell_y)]
+                del cell[obj]
+                if not cell:
+                    del self.cells[(cell_x, cell_y)]
+
+    def insert(self, obj, rect):
+        """Registers obj with rect, the rect object is kept so in place moves only need update(obj)"""
+        if obj in self.entries:
+            self.remove(obj)
+        cell_range = self.cell_range(rect)
+        self.entries[obj] = (rect, cell_range)
+        self.add_to_cells(obj, cell_range)
+
+    def update(self, obj):
+        rect, cell_range = self.entries[obj]
+        new_range = self.cell_range(rect)
+        if new_range != cell_range:
+            self.remove_from_cells(obj, cell_range)
+            self.add_to_cells(obj, new_range)
+            self.entries[obj] = (rect, new_range)
+
+    def remove(self, obj):
+        entry = self.entries.pop(obj, None)
+        if entry is not None:
+            self.remove_from_cells(obj, entry[1])
+
+    def clear(self):
+        self.cells.clear()
+        self.entries.clear()
+
+    def query(self, rect):
+        """Returns the objects whose rect overlaps rect"""
+        found = []
+        seen = set()
+        left, top, right, bottom = self.cell_range(rect)
+        for cell_x in range(left, right + 1):
+            for cell_y in range(top, bottom + 1):
+                cell = self.cells.get((cell_x, cell_y))
+                if cell is None:
+                    continue
+                for obj in cell:
+                    if obj not in seen:
+                        seen.add(obj)
+                        if self.entries[obj][0].colliderect(rect):
+                            found.append(obj)
+        return found
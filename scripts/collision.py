@@ -0,0 +1,140 @@
+import pygame
+from scripts.tile_grid import *
+
+# Kind flags of a cell, the low bits only count collision enabled layers while the
+# high bits count every layer (solid_check and the end tile check ignore the layer toggle)
+SOLID = 1
+KILL = 2
+VICTORY = 4
+ANY_LAYER_SHIFT = 3
+ANY_SOLID = SOLID << ANY_LAYER_SHIFT
+ANY_KILL = KILL << ANY_LAYER_SHIFT
+ANY_VICTORY = VICTORY << ANY_LAYER_SHIFT
+ANY_PHYSICS = ANY_SOLID | ANY_KILL | ANY_VICTORY
+
+TILE_KINDS = {"dirt": SOLID, "mossy_stone": SOLID, "castle_stone": SOLID, "kill_tile": KILL, "victory_tile": VICTORY}
+
+# kind of every interned element id, grown lazily as new elements get interned
+ELEMENT_KINDS = [0]
+
+def element_kind(element_id):
+    while len(ELEMENT_KINDS) < len(ELEMENT_NAMES):
+        ELEMENT_KINDS.append(TILE_KINDS.get(ELEMENT_NAMES[len(ELEMENT_KINDS)][1], 0))
+    return ELEMENT_KINDS[element_id]
+
+
+class Collision_index:
+    """Per cell kind bitmap merged across all layers, stored in the same chunks as the tile grids"""
+    def __init__(self) -> None:
+        self.chunks = {}
+
+    def build(self, layer_list):
+        self.chunks = {}
+        for key in {key for layer in layer_list for key in layer["grid"].chunks}:
+            self.build_chunk(key, layer_list)
+
+    def build_chunk(self, key, layer_list):
+        cells = bytearray(CHUNK_AREA)
+        for layer in layer_list:
+            chunk = layer["grid"].chunks.get(key)
+            if chunk is None:
+                continue
+            collision = layer["collision"]
+            elements = chunk.elements
+            for index in chunk.occupied:
+                kind = element_kind(elements[index])
+                if kind:
+                    cells[index] |= kind << ANY_LAYER_SHIFT
+                    if collision:
+                        cells[index] |= kind
+        self.chunks[key] = cells
+
+    def drop_chunk(self, key):
+        self.chunks.pop(key, None)
+
+    def get(self, x, y):
+        cells = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if cells is None:
+            return 0
+        return cells[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def update_cell(self, x, y, layer_list):
+        """Recomputes a single cell after an edit, only has to look at that cell in every layer"""
+        flags = 0
+        for layer in layer_list:
+            kind = element_kind(layer["grid"].get(x, y))
+            if kind:
+                flags |= kind << ANY_LAYER_SHIFT
+                if layer["collision"]:
+                    flags |= kind
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        cells = self.chunks.get(key)
+        if cells is None:
+            if not flags:
+                return
+            cells = self.chunks[key] = bytearray(CHUNK_AREA)
+        cells[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] = flags
+
+
+class Static_geometry:
+    """Solid cells of the collision layers merged into maximal rectangles, kept per chunk so edits only rebuild one chunk"""
+    def __init__(self, collision_index, tile_size) -> None:
+        self.collision_index = collision_index
+        self.tile_size = tile_size
+        self.chunk_pixels = CHUNK_SIZE * tile_size
+        self.chunk_rects = {}
+        self.dirty = set(collision_index.chunks)
+
+    def invalidate_cell(self, x, y):
+        self.dirty.add((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+
+    def invalidate_chunk(self, key):
+        self.dirty.add(key)
+
+    def invalidate_all(self):
+        self.chunk_rects = {}
+        self.dirty = set(self.collision_index.chunks)
+
+    def build_chunk(self, key):
+        rects = []
+        cells = self.collision_index.chunks.get(key)
+        if cells is not None:
+            used = bytearray(CHUNK_AREA)
+            for index in range(CHUNK_AREA):
+                if not cells[index] & SOLID or used[index]:
+                    continue
+                x = index & CHUNK_MASK
+                y = index >> CHUNK_SHIFT
+                # Grow the rect right as far as the row allows, then down while every cell under it is solid too
+                width = 1
+                while x + width < CHUNK_SIZE and cells[index + width] & SOLID and not used[index + width]:
+                    width += 1
+                height = 1
+                while y + height < CHUNK_SIZE:
+                    row = index + (height << CHUNK_SHIFT)
+                    if all(cells[row + i] & SOLID and not used[row + i] for i in range(width)):
+                        height += 1
+                    else:
+                        break
+                for dy in range(height):
+                    row = index + (dy << CHUNK_SHIFT)
+                    used[row:row + width] = b"\x01" * width
+                rects.append(pygame.rect.Rect(((key[0] << CHUNK_SHIFT) + x) * self.tile_size, ((key[1] << CHUNK_SHIFT) + y) * self.tile_size, width * self.tile_size, height * self.tile_size))
+        if rects:
+            self.chunk_rects[key] = rects
+        elif key in self.chunk_rects:
+            del self.chunk_rects[key]
+
+    def query(self, rect):
+        """Returns the merged rects overlapping rect, they are shared so callers must not move them"""
+        if self.dirty:
+            for key in self.dirty:
+                self.build_chunk(key)
+            self.dirty.clear()
+        hits = []
+        for chunk_x in range(rect.left // self.chunk_pixels, (rect.right - 1) // self.chunk_pixels + 1):
+            for chunk_y in range(rect.top // self.chunk_pixels, (rect.bottom - 1) // self.chunk_pixels + 1):
+                for solid_rect in self.chunk_rects.get((chunk_x, chunk_y), ()):
+                    if solid_rect.colliderect(rect):
+                        hits.append(solid_rect)
+        return hits
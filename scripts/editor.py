@@ -3,8 +3,11 @@ from pygame.math import Vector2
 from pygame.mouse import get_pos as mouse_pos
 
 from scripts.tilemap import Tilemap
+from scripts.tile_grid import *
+from scripts.render_cache import Chunk_render_cache
 from scripts.utils import *
 from scripts.level import Level
+from scripts.profiler import handle_profiler_key
 
 class Editor:
     def __init__(self, game, level_name) -> None:
@@ -39,6 +42,13 @@ class Editor:
         self.level_name = level_name
         self.tilemap =  Tilemap(self.game, self.level_name)
         self.layer_index = 0
+        # Layer graphics cached per chunk in world space, keyed by id of the layer dict
+        self.layer_caches = {}
+        # Every layer gets resolved once on load so none is drawn with stale variances, after that only edits dirty cells
+        self.tilemap.mark_all_dirty()
+        for layer_index in range(len(self.tilemap.layer_list)):
+            self.fix_tiles(layer_index)
+        self.layer_preview = transparent_surface(self.game.display.get_size())
 
         self.border_click = False
         self.first_border_point = (0,0)
@@ -88,6 +98,8 @@ class Editor:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     return True  # Return to menu
+
+                handle_profiler_key(self.game, event.key)
                     
                 if event.key == pygame.K_b:
                     if self.border_click:
@@ -167,6 +179,7 @@ class Editor:
                 self.layer_index += 1
                 self.dont_place_tiles_timer = 10
             if self.editor_interface.remove_layer_button.rect.collidepoint(mouse_pos()[0], mouse_pos()[1]) and self.dont_place_tiles_timer == 0:
+                self.layer_caches.pop(id(self.tilemap.layer_list[self.layer_index]), None)
                 self.tilemap.delete_layer(self.layer_index)
                 if self.layer_index != 0:
                     self.layer_index -=1
@@ -180,7 +193,7 @@ class Editor:
                 self.left_click = False
                 self.dont_place_tiles_timer = 10
             if self.editor_interface.collision_button_unpressed.rect.collidepoint(mouse_pos()[0], mouse_pos()[1]) and self.dont_place_tiles_timer == 0:
-                self.tilemap.layer_list[self.layer_index]["collision"] = not self.tilemap.layer_list[self.layer_index]["collision"]
+                self.tilemap.toggle_collision(self.layer_index)
                 self.dont_place_tiles_timer = 10
 
 
@@ -189,8 +202,10 @@ class Editor:
             if self.dont_place_tiles_timer == 0:
                 if self.ctrl_click:
                     self.tilemap.add_offgrid_element(self.current_element, mouse_pos(),self.layer_index)
+                    self.get_layer_cache(self.tilemap.layer_list[self.layer_index]).invalidate_offgrid()
                 else:
                     self.tilemap.add_element_tile(self.current_element, self.grid_mouse_position,self.layer_index)
+                    self.invalidate_tile(self.grid_mouse_position, self.layer_index)
                 for but in self.editor_interface.hotbar:
                     but.clicked = False
 
@@ -198,8 +213,10 @@ class Editor:
         if self.dont_place_tiles_timer == 0 and self.right_click: # maybe change the timer but it should be okay
             if self.ctrl_click:
                 self.tilemap.delete_offgrid_element(mouse_pos(), self.scroll, self.layer_index)
+                self.get_layer_cache(self.tilemap.layer_list[self.layer_index]).invalidate_offgrid()
             else:
                 self.tilemap.delete_element_tile(self.grid_mouse_position, self.layer_index)
+                self.invalidate_tile(self.grid_mouse_position, self.layer_index)
     
     def draw_grid_lines(self):
         self.grid_lines_surf.fill(ALPHA_COLOR)
@@ -229,29 +246,32 @@ class Editor:
             y = int(distance_to_origin.y / self.game.tile_size) - 1
         self.grid_mouse_position = (x, y)
     
+    def get_layer_cache(self, layer):
+        if id(layer) not in self.layer_caches:
+            self.layer_caches[id(layer)] = Editor_layer_cache(self.game, layer)
+        return self.layer_caches[id(layer)]
+
+    def invalidate_tile(self, pos, layer_index):
+        # Neighbours whose variance the edit changes get invalidated by fix_tiles
+        self.get_layer_cache(self.tilemap.layer_list[layer_index]).invalidate_cell(pos[0], pos[1])
+
+    def fix_tiles(self, layer_index):
+        layer_cache = self.get_layer_cache(self.tilemap.layer_list[layer_index])
+        for x, y in self.tilemap.tile_fix(layer_index):
+            layer_cache.invalidate_cell(x, y)
+
     def draw_tilemap(self):
-        self.tilemap.surface.fill("lightblue")
+        view_origin = -self.scroll
         mult = 1
         for layer_index, layer in enumerate(self.tilemap.layer_list):
-            # layer["surface"].fill(ALPHA_COLOR)
-            self.tilemap.layer_surfaces[layer_index].fill(ALPHA_COLOR)
-            for cord_keys in layer["grid"]:
-                element_surface_list = self.game.static_assets[layer["grid"][cord_keys]["world_element_type"] + "/" + layer["grid"][cord_keys]["element"]]
-                element_variance = layer["grid"][cord_keys]["variance"]
-                element_pos = layer["grid"][cord_keys]["pos"]
-                self.tilemap.layer_surfaces[layer_index].blit(element_surface_list[element_variance], (element_pos[0] * self.game.tile_size + self.scroll[0], element_pos[1] * self.game.tile_size + self.scroll[1]))
-            for cord_keys in layer["off_grid"]:
-                element_surface_list = self.game.static_assets[layer["off_grid"][cord_keys]["world_element_type"] + "/" + layer["off_grid"][cord_keys]["element"]]
-                element_variance = layer["off_grid"][cord_keys]["variance"]
-                element_pos = layer["off_grid"][cord_keys]["pos"]
-                self.tilemap.layer_surfaces[layer_index].blit(element_surface_list[element_variance], (element_pos[0] + self.scroll[0], element_pos[1] + self.scroll[1]))
-            layer_surface_copy = self.tilemap.layer_surfaces[layer_index].copy()
             if layer_index > self.layer_index:
                 mult *= 2
-            layer_surface_copy.set_alpha(255//mult)
-            self.tilemap.surface.blit(layer_surface_copy, (0,0))
+            layer_cache = self.get_layer_cache(layer)
+            layer_cache.alpha = 255//mult
+            layer_cache.render(self.surface, view_origin)
 
-        self.surface.blit(self.tilemap.surface, (0,0))
+        self.layer_preview.fill(ALPHA_COLOR)
+        self.get_layer_cache(self.tilemap.layer_list[self.layer_index]).render(self.layer_preview, view_origin)
 
     def handle_border(self):
         if self.border_click: # we are rendering a new border
@@ -281,19 +301,22 @@ class Editor:
             self.handle_border()
 
             # Auto fix tiles
-            self.tilemap.tile_fix(self.layer_index)
+            with self.game.profiler.scope("editor/tile_fix"):
+                self.fix_tiles(self.layer_index)
             # Update Current Tile
             self.current_element = self.world_elements_matrix[self.editor_interface.selected_index][self.editor_interface.hotbar[self.editor_interface.selected_index].button_index]
             self.update_grid_mouse_pos()
             # Rendering and updating the screen with the map and the menu
             self.render(font)
+            self.game.profiler.end_frame()
 
     def render(self, font):
         # Render background
         self.surface.fill("lightblue")
 
         # Render tilemap
-        self.draw_tilemap()
+        with self.game.profiler.scope("editor/draw_tilemap"):
+            self.draw_tilemap()
 
         # Render origin point
         pygame.draw.circle(self.surface, "red", self.scroll, 7)
@@ -318,10 +341,10 @@ class Editor:
         # Rendering the finished scaled_display with the menu on top to the screen
         self.game.display.blit(self.scaled_display, (0,0))
         # Render debugging text
-        # text = font.render(str(self.tilemap.layer_surfaces), True, "white", pygame.SRCALPHA)
         # text = font.render(str(self.scroll.x % self.game.tile_size) + "|" + str(self.grid_mouse_position) + "|" + str(self.scroll.x), True, "white", pygame.SRCALPHA)
         text = font.render(str(self.grid_mouse_position),True, "white", pygame.SRCALPHA)
         self.game.display.blit(text, (self.game.width - text.get_width(), 0))
+        self.game.profiler_overlay.render(self.game.display)
         # Updating/refreshing the screen
         pygame.display.update()
 
@@ -333,12 +356,60 @@ class Editor:
             element_list = []
             for folder_element in os.listdir(world_elements_path + "/" + folder_type):
                 if not (folder_type == "entities" and folder_element == "player"):
-                    element_path = world_elements_path + "/" + folder_type + "/" + folder_element
-                    element_list.append(Element(folder_type, folder_element, element_path))
+                    element_list.append(Element(folder_type, folder_element, self.game.icon_assets[folder_type + "/" + folder_element]))
             mat.append(element_list)
         return mat
 
 
+class Editor_layer_cache(Chunk_render_cache):
+    """Every grid and off grid element of one layer baked per chunk, only edits on the layer clear chunks"""
+    def __init__(self, game, layer) -> None:
+        super().__init__(game)
+        self.layer = layer
+        self.alpha = 255
+        self.offgrid_chunks = None
+
+    def new_chunk_surface(self):
+        return pygame.Surface((self.chunk_pixels, self.chunk_pixels), pygame.SRCALPHA)
+
+    def get_offgrid_chunks(self):
+        # Off grid elements can overlap several chunks, so each one is listed under every chunk it touches
+        if self.offgrid_chunks is None:
+            self.offgrid_chunks = {}
+            for tile in self.layer["off_grid"].values():
+                rect = self.game.static_assets[tile["world_element_type"] + "/" + tile["element"]][tile["variance"]].get_rect(topleft = tile["pos"])
+                for chunk_x in range(rect.left // self.chunk_pixels, (rect.right - 1) // self.chunk_pixels + 1):
+                    for chunk_y in range(rect.top // self.chunk_pixels, (rect.bottom - 1) // self.chunk_pixels + 1):
+                        self.offgrid_chunks.setdefault((chunk_x, chunk_y), []).append(tile)
+        return self.offgrid_chunks
+
+    def invalidate_offgrid(self):
+        # Drops the chunks covered by off grid elements both before and after the edit
+        for key in self.get_offgrid_chunks():
+            self.drop(key)
+        self.offgrid_chunks = None
+        for key in self.get_offgrid_chunks():
+            self.drop(key)
+
+    def chunk_has_content(self, key):
+        return key in self.layer["grid"].chunks or key in self.get_offgrid_chunks()
+
+    def bake_chunk(self, key, surface):
+        origin = (key[0] * self.chunk_pixels, key[1] * self.chunk_pixels)
+        for x, y, element, variance in self.layer["grid"].chunk_tiles(key):
+            world_element_type, element = element_name(element)
+            element_surface_list = self.game.static_assets[world_element_type + "/" + element]
+            surface.blit(element_surface_list[variance], (x * self.game.tile_size - origin[0], y * self.game.tile_size - origin[1]))
+        for tile in self.get_offgrid_chunks().get(key, ()):
+            element_surface_list = self.game.static_assets[tile["world_element_type"] + "/" + tile["element"]]
+            surface.blit(element_surface_list[tile["variance"]], (tile["pos"][0] - origin[0], tile["pos"][1] - origin[1]))
+
+    def get_chunk(self, key):
+        surface = super().get_chunk(key)
+        surface.set_alpha(self.alpha)
+        return surface
+
+
 class Editor_interface:
     def __init__(self, game, editor) -> None:
         self.game = game
@@ -405,7 +476,7 @@ class Editor_interface:
         layer_display_surf = pygame.Surface((self.game.width // 10 , self.game.height // 10))
         layer_display_surf.fill((0,0,0))
         # source = pygame.transform.scale(self.editor.tilemap.layer_list[self.editor.layer_index]["surface"], (128,72))
-        source = pygame.transform.scale(self.editor.tilemap.layer_surfaces[self.editor.layer_index], (128,72))
+        source = pygame.transform.scale(self.editor.layer_preview, (128,72))
 
         source.set_alpha(255)
         layer_display_surf.blit(source, (0,0))
@@ -446,10 +517,11 @@ class Button:
 
         
 class Element:
-    def __init__(self, world_element_type, element , path) -> None:
+    def __init__(self, world_element_type, element , surface) -> None:
         self.world_element_type = world_element_type
         self.element = element
-        self.surface = pygame.image.load(path + "/icon/00.png")
+        # Shared with the game's atlas, so it must not be drawn on
+        self.surface = surface
 
     def __str__(self) -> str:
         return f"type: {self.world_element_type}, element: {self.element}"
@@ -1,32 +1,59 @@
 import pygame
 
+# Bits of Entity.collision_flags
+COLLIDE_TOP = 1
+COLLIDE_BOTTOM = 2
+COLLIDE_RIGHT = 4
+COLLIDE_LEFT = 8
+# Bits of Entity.movement_flags
+MOVE_LEFT = 1
+MOVE_RIGHT = 2
+MOVEMENT_FLAGS = {"left": MOVE_LEFT, "right": MOVE_RIGHT}
+
 class Entity:
+    # Constants of a kind of entity live on the class, only the changing state is stored per instance
+    size = (32,32)
+    gravity = 0.3  # th = 1 ->  g= 6.5, th = 0.5 -> g = 26
+    speed = 2.5
+    # x = x0 + v0t + 0.5at^2 -> t = 1 (one frame) -> 
+    draw_offset = pygame.math.Vector2(0,0)
+    animation_speed = {}
+
+    __slots__ = ("game", "level", "pos", "entity_name", "rect", "velocity", "movement_flags", "status", "img", "flip",
+                 "animation_index", "hit", "collision_flags", "dying", "death", "health", "previous_pos")
+
     def __init__(self, game, level, pos, entity_name) -> None:
         self.game = game
         self.level = level
         self.pos = pygame.math.Vector2(pos[0], pos[1])
+        # Position before the last simulation step, for drawing frames that fall between steps
+        self.previous_pos = pygame.math.Vector2(pos[0], pos[1])
         self.entity_name = entity_name
-        # self.size = None
-        self.rect = None
+        self.rect = pygame.Rect(0, 0, 0, 0)
         self.rect_update()
         self.velocity = pygame.math.Vector2(0,0)
-        self.gravity = 0.3  # th = 1 ->  g= 6.5, th = 0.5 -> g = 26
-        self.speed = 2.5
-        self.movement = {"left": False, "right": False}
-        # x = x0 + v0t + 0.5at^2 -> t = 1 (one frame) -> 
-        self.draw_offset = pygame.math.Vector2(0,0)
+        self.movement_flags = 0
         self.status = "idle"
         self.img = None
         self.flip = False
-        self.animation_speed = {}
         self.animation_index = 0
         self.hit = False
-        self.collisions = {'top': False, 'bottom': False, 'right': False, 'left': False}
+        self.collision_flags = 0
         self.dying = False
         self.death = False
 
         self.health = 1
 
+    def set_movement(self, direction, pressed):
+        """Presses or releases the "left" or "right" movement key"""
+        if pressed:
+            self.movement_flags |= MOVEMENT_FLAGS[direction]
+        else:
+            self.movement_flags &= ~MOVEMENT_FLAGS[direction]
+
+    def on_ground(self):
+        return bool(self.collision_flags & COLLIDE_BOTTOM)
+
 
     def update(self):
         if self.health <= 0:
@@ -60,16 +87,7 @@ class Entity:
 
     def check_end_tile_at_pos(self, pos):
         """Check if there's an end tile (kill_tile or victory_tile) at the specific position"""
-        tile_loc = (int(pos[0] // self.level.game.tile_size), int(pos[1] // self.level.game.tile_size))
-        for layer in self.level.tilemap.layer_list:
-            check_loc = str(tile_loc[0]) + ';' + str(tile_loc[1])
-            if check_loc in layer["grid"]:
-                element = layer["grid"][check_loc]["element"]
-                if element == "kill_tile":
-                    return "death"
-                elif element == "victory_tile":
-                    return "victory"
-        return None
+        return self.level.tilemap.end_tile_check(pos)
 
     def check_special_tiles(self):
         """Check for special tiles (kill tiles, victory tiles, etc.) at the player's current position"""
@@ -85,23 +103,24 @@ class Entity:
         
     def handle_horizontal_collision(self):
         # Reseting collisions
-        self.collisions["left"] = False
-        self.collisions["right"] = False
+        self.collision_flags &= ~(COLLIDE_LEFT | COLLIDE_RIGHT)
 
+        # Only the merged level rects overlapping the area swept this frame need to be tested
+        swept_rect = self.rect.union(self.rect.move(-self.velocity.x, 0))
         # Going left
         if self.velocity.x < 0:
-            for tile_rect, element in self.level.tilemap.physics_rect_around((self.rect.left, self.rect.centery)):
-                if self.rect.colliderect(tile_rect) and element not in ["kill_tile", "victory_tile"]:
+            for tile_rect in self.level.tilemap.static_geometry.query(swept_rect):
+                if self.rect.colliderect(tile_rect):
                     self.rect.left = tile_rect.right
                     self.pos.x =  self.rect.left
-                    self.collisions["left"] = True
+                    self.collision_flags |= COLLIDE_LEFT
         else: #self.velocity.x >= 0
-            for tile_rect, element in self.level.tilemap.physics_rect_around((self.rect.right, self.rect.centery)):
-                if self.rect.colliderect(tile_rect) and element not in ["kill_tile", "victory_tile"]:
+            for tile_rect in self.level.tilemap.static_geometry.query(swept_rect):
+                if self.rect.colliderect(tile_rect):
                     self.rect.right = tile_rect.left
                     self.pos.x =  self.rect.left
 
-                    self.collisions["right"] = True
+                    self.collision_flags |= COLLIDE_RIGHT
 
     def handle_y_velocity(self):
         self.velocity.y = min(self.velocity.y + self.gravity, 8) # add maximum speed
@@ -111,47 +130,46 @@ class Entity:
 
     def handle_vertical_collision(self):
         # Reseting collisions
-        self.collisions["bottom"] = False
-        self.collisions["top"] = False
+        self.collision_flags &= ~(COLLIDE_BOTTOM | COLLIDE_TOP)
 
+        swept_rect = self.rect.union(self.rect.move(0, -self.velocity.y))
         # Going down
         if self.velocity.y >= 0:
-            for tile_rect, element in self.level.tilemap.physics_rect_around((self.rect.centerx, self.rect.bottom)):
-                if (self.rect.colliderect(tile_rect) or self.rect.move(0,1).colliderect(tile_rect)) and element not in ["kill_tile", "victory_tile"]:
+            for tile_rect in self.level.tilemap.static_geometry.query(swept_rect.inflate(0, 2)):
+                if self.rect.colliderect(tile_rect) or self.rect.move(0,1).colliderect(tile_rect):
                     self.rect.bottom = tile_rect.top
                     self.velocity.y = 0
                     self.pos.y = self.rect.top
-                    self.collisions["bottom"] = True
+                    self.collision_flags |= COLLIDE_BOTTOM
         # Going up
         else:
-            for tile_rect, element in self.level.tilemap.physics_rect_around((self.rect.centerx, self.rect.top)):
-                if self.rect.colliderect(tile_rect) and element not in ["kill_tile", "victory_tile"]:
+            for tile_rect in self.level.tilemap.static_geometry.query(swept_rect):
+                if self.rect.colliderect(tile_rect):
                     self.rect.top = tile_rect.bottom
                     self.velocity.y = 0
                     self.pos.y = self.rect.top
-                    self.collisions["top"] = True
+                    self.collision_flags |= COLLIDE_TOP
         
 
         
 
     def rect_update(self):
-        # Method for updating rect position (since rect can only work on integers)
-        self.rect = pygame.Rect((self.pos[0]), (self.pos[1]) , self.size[0], self.size[1])
+        # Method for updating rect position (since rect can only work on integers), updated in place so no rect gets allocated
+        self.rect.update(self.pos[0], self.pos[1], self.size[0], self.size[1])
 
     def render(self):
-        int_pos = pygame.math.Vector2(int(self.pos[0]), int(self.pos[1]))
-        self.level.surface.blit(self.img, int_pos - self.level.scroll - self.draw_offset)
+        pos = self.pos
+        if self.level.render_alpha < 1:
+            pos = self.previous_pos.lerp(pos, self.level.render_alpha)
+        int_pos = pygame.math.Vector2(int(pos[0]), int(pos[1]))
+        self.level.surface.blit(self.img, int_pos - self.level.render_scroll - self.draw_offset)
 
 
 
     def handle_img_animation(self):
         dict_path = self.entity_name + "/" + self.status
         self.animation_index = (self.animation_index + self.animation_speed[self.status]) % len(self.game.entities_assets[dict_path])
-        img = self.game.entities_assets[dict_path][int(self.animation_index)]
-        if self.flip: 
-            self.img = pygame.transform.flip(img,True,False)
-        else:
-            self.img = img
+        self.img = self.game.frame_cache.get(dict_path, int(self.animation_index), self.flip)
 
     def handle_status(self):
         if self.dying:
@@ -175,11 +193,14 @@ class Entity:
 
 
 class Mob(Entity):
+    __slots__ = ("player", "attack_cd", "attack_range_rect", "spawn_cell")
+
     def __init__(self, game, level, pos, entity_name, player) -> None:
         super().__init__(game, level, pos, entity_name)
         self.player = player
         self.attack_cd = 180
         self.attack_range_rect = pygame.rect.Rect(0,0,0,0)
+        self.spawn_cell = None
 
     def check_special_tiles(self):
         pass
@@ -188,7 +209,8 @@ class Mob(Entity):
         super().update()
         if self.attack_cd != 180:
             self.attack_cd += 1
-        if self.attack_range_rect.colliderect(self.player.rect) and self.attack_cd == 180 and not self.dying:
+        # The level finds the mobs whose attack range holds the player through its broadphase once per tick
+        if self in self.level.player_in_attack_range and self.attack_cd == 180 and not self.dying:
             self.attack_cd = 0
             self.attack()
             #self.level.enemy_projectiles.append(String_Projectile)
@@ -1,28 +1,77 @@
 import pygame, sys, math
 from scripts.tilemap import Tilemap
+from scripts.tile_grid import *
+from scripts.render_cache import Chunk_render_cache
 from scripts.utils import *
 from scripts.player import Player
 from scripts.particles import *
+from scripts.projectiles import Ba_projectile
+from scripts.pool import Pool
+from scripts.broadphase import Spatial_grid
+from scripts.profiler import handle_profiler_key
+from scripts.background import Parallax_background
 
 NO_SHOW_TILES = ["player_spawner", "kill_tile"]
+STREAM_RADIUS = 2 # chunks kept around the player in streaming mode
+SIMULATION_MARGIN = 256 # pixels around the view where mobs keep simulating, the ones further away sleep
+SIMULATION_RATE = 60 # fixed steps per second, every physics constant is per step
+MAX_CATCH_UP_STEPS = 5 # steps a single frame may run before the remaining lag is dropped and the game slows down
+RENDER_FPS_LIMIT = 240 # 0 renders as fast as the machine allows
+# Background images back to front with how far they move per pixel of camera scroll
+BACKGROUND_LAYERS = [("assets/backgrounds/ellinia.jpeg", (0.5, 0.5))]
+# Player input of one simulation step, the held movement keys and the jump / restart presses since the last step
+INPUT_LEFT = 1
+INPUT_RIGHT = 2
+INPUT_JUMP = 4
+INPUT_JUMP_RELEASE = 8
+INPUT_RESTART = 16
+INPUT_HELD = INPUT_LEFT | INPUT_RIGHT
 
 class Level:
-    def __init__(self, game, level_name) -> None:
+    def __init__(self, game, level_name, streaming = False, seed = None) -> None:
         self.game = game
         self.level_name = level_name  # Store level name for restart
-        self.tilemap = Tilemap(game, level_name) # add loading tilemap instead
+        # Seed of the particle randomness, a level replayed with the same seed and inputs plays out the same
+        self.seed = seed
+        self.tilemap = Tilemap(game, level_name, streaming) # add loading tilemap instead
         self.enemy_list = []
+        # Spawn cells of killed mobs, so streamed chunks don't bring them back
+        self.killed_spawns = set()
+        self.stream_center = None
         self.attack_list = []
-        self.particle_list = []
+        self.particles = Particle_system(seed)
         self.enemy_projectiles = []
+        # Projectiles are recycled instead of allocated on every attack
+        self.projectile_pools = {Ba_projectile: Pool(Ba_projectile)}
+        # Broadphase of mob bodies, mob attack ranges and projectiles, every test against the player goes through them
+        self.mob_grid = Spatial_grid()
+        self.attack_grid = Spatial_grid()
+        self.projectile_grid = Spatial_grid()
+        # Mobs whose attack range held the player at the start of the tick, read by Mob.update
+        self.player_in_attack_range = set()
+        # Mobs near the view that got updated this tick, a None margin simulates every mob
+        self.simulation_margin = SIMULATION_MARGIN
+        self.awake_enemies = []
+        # INPUT_ bits gathered by event_loop, and every step's inputs while recording (see scripts/replay.py)
+        self.input_state = 0
+        self.recorded_inputs = None
         self.scroll = pygame.math.Vector2(0,0)
-        self.surface = pygame.Surface(self.game.display.get_size())
+        self.previous_scroll = pygame.math.Vector2(0,0)
+        # Frames falling between two simulation steps are drawn render_alpha of the way from the previous step
+        self.render_alpha = 1
+        self.render_scroll = self.scroll
         self.render_scale = 2
+        self.view_size = (self.game.width // self.render_scale, self.game.height // self.render_scale)
+        # The world is drawn at view resolution and scaled straight into the display, nothing full screen is allocated per frame
+        self.surface = pygame.Surface(self.view_size)
+        # Particles and projectiles are queued here each frame and drawn with a few Surface.blits calls
+        self.render_batch = Render_batch(self.view_size)
         self.load_player()
         self.camera_borders = {}
         self.load_camera_borders()
         self.tile_surface = self.draw_tiles()
-        self.background_img, self.background_img_size = self.make_background_img()
+        self.spawn_entities()
+        self.background = self.make_background()
 
         
         self.heart_img = [pygame.image.load("assets/interface/hearts/0.png"),pygame.image.load("assets/interface/hearts/1.png")]
@@ -31,53 +80,79 @@ class Level:
         # Game end system variables
         self.game_end_state = "alive"  # "alive", "ending", "ended"
         self.game_end_timer = 0
-        self.game_end_animation_duration = 60  # 1 second at 60 FPS
+        self.game_end_animation_duration = SIMULATION_RATE  # 1 second of simulation steps
         self.fade_alpha = 0
         self.game_end_font = pygame.font.SysFont('Arial', 48, bold=True)
         self.game_end_small_font = pygame.font.SysFont('Arial', 24)
+        # Full screen overlay of the death / victory screen, refilled instead of allocated every frame
+        self.game_end_overlay = pygame.Surface((self.game.width, self.game.height))
 
 
 
 
 
-    def make_background_img(self):
-        img = pygame.image.load("./assets/backgrounds/ellinia.jpeg")
-        # img = pygame.image.load("./assets/backgrounds/forest_midj.png")
-        
-        img_size =  img.get_size()
-        new_img = pygame.Surface((img_size[0] * 3, img_size[1] * 3))
-
-        for i in range(3):
-            for j in range(3):
-                new_img.blit(img,(i*img_size[0], j*img_size[1]))
-        return new_img, img_size
+    def make_background(self):
+        background = Parallax_background()
+        for path, factor in BACKGROUND_LAYERS:
+            background.add_layer(pygame.image.load(path), factor)
+        return background
 
     def load_player(self):
         # First load player, then the rest (cause the monster needs the player to be made) need to change this later with a pointer to player_spawner)
-        for layer in self.tilemap.layer_list:
-            for key in layer["grid"]:
-                if layer["grid"][key]["element"] == "player_spawner":
-                    self.scroll.x = layer["grid"][key]["pos"][0] * (self.game.tile_size)  - self.game.width / (2 * self.render_scale)
-                    self.scroll.y = layer["grid"][key]["pos"][1] * (self.game.tile_size)  - self.game.height  / (2 * self.render_scale)
-                    self.player = Player(self.game,self, pygame.math.Vector2(layer["grid"][key]["pos"][0] * (self.game.tile_size), layer["grid"][key]["pos"][1] * (self.game.tile_size)), "player")
+        spawn = self.tilemap.player_spawn
+        if spawn is None:
+            spawn = self.tilemap.find_player_spawn()
+        if spawn is None:
+            raise ValueError(f"level {self.level_name} has no player_spawner")
+        self.scroll.x = spawn[0] * (self.game.tile_size)  - self.game.width / (2 * self.render_scale)
+        self.scroll.y = spawn[1] * (self.game.tile_size)  - self.game.height  / (2 * self.render_scale)
+        self.previous_scroll.update(self.scroll)
+        self.player = Player(self.game,self, pygame.math.Vector2(spawn[0] * (self.game.tile_size), spawn[1] * (self.game.tile_size)), "player")
 
     def run(self):
-        font = pygame.font.SysFont('Arial', 32)
+        step_time = 1 / SIMULATION_RATE
+        # The first frame runs a step so every entity has an image before it gets drawn
+        lag = step_time
+        # Don't count the level loading as time to catch up on
+        self.game.clock.tick()
         while True:
-            self.game.clock.tick(60)
+            lag += self.game.clock.tick(RENDER_FPS_LIMIT) / 1000
             # Event loop and player input
             if self.event_loop():
                 return True
-            
-            # Update death state
-            self.update_death_state()
-            
-            # Only update game if not dead
-            if self.game_end_state == "alive":
-                self.update()
 
-            self.update_scroll()
-            self.render(font)
+            # The simulation runs in fixed steps whatever the frame rate, a slow frame runs several of them
+            steps = 0
+            while lag >= step_time and steps < MAX_CATCH_UP_STEPS:
+                self.step(self.take_input())
+                lag -= step_time
+                steps += 1
+            if steps == MAX_CATCH_UP_STEPS:
+                lag = min(lag, step_time)
+
+            self.render(lag / step_time)
+            self.game.profiler.end_frame()
+
+    def step(self, inputs = None):
+        """One fixed simulation step, inputs are its INPUT_ bits or None when the player is driven directly"""
+        # Refreshed on every step, also once the level ended and nothing moves, so frames between steps don't lerp back to the last move
+        self.player.previous_pos.update(self.player.pos)
+        for enemy in self.awake_enemies:
+            enemy.previous_pos.update(enemy.pos)
+        if inputs is not None:
+            if self.recorded_inputs is not None:
+                self.recorded_inputs.append(inputs)
+            self.apply_input(inputs)
+
+        # Update death state
+        self.update_death_state()
+
+        # Only update game if not dead
+        if self.game_end_state == "alive":
+            self.update()
+
+        self.previous_scroll.update(self.scroll)
+        self.update_scroll()
 
     def event_loop(self):
         for event in pygame.event.get():
@@ -88,11 +163,14 @@ class Level:
             if event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_ESCAPE:
                     return True
+
+                if handle_profiler_key(self.game, event.key):
+                    continue
                 
                 # Death state input handling
                 if self.game_end_state == "ended":
                     if event.key == pygame.K_r:
-                        self.restart_level()
+                        self.input_state |= INPUT_RESTART
                         return False  # Continue game loop
                     elif event.key == pygame.K_ESCAPE:
                         return True  # Return to menu
@@ -101,61 +179,126 @@ class Level:
                 
                 # Normal game input (only when alive)
                 if self.game_end_state == "alive":
-                    if (event.key == pygame.K_w or event.key == pygame.K_UP) and self.player.collisions["bottom"]:
-                        self.player.velocity.y = -8
+                    if event.key == pygame.K_w or event.key == pygame.K_UP:
+                        self.input_state |= INPUT_JUMP
                     
                     if event.key == pygame.K_a or event.key == pygame.K_LEFT:
-                        self.player.movement["left"] = True
+                        self.input_state |= INPUT_LEFT
 
                     if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
-                        self.player.movement["right"] = True
+                        self.input_state |= INPUT_RIGHT
 
             if event.type == pygame.KEYUP:
                 if (event.key == pygame.K_w or event.key == pygame.K_UP):
-                    if self.player.velocity.y < 0:
-                        # self.player.velocity.y = -1 * self.player.velocity.y
-                        self.player.velocity.y = 0
+                    self.input_state |= INPUT_JUMP_RELEASE
 
                 if event.key == pygame.K_a or event.key == pygame.K_LEFT:
-                    self.player.movement["left"] = False
+                    self.input_state &= ~INPUT_LEFT
 
                 if event.key == pygame.K_d or event.key == pygame.K_RIGHT:
-                    self.player.movement["right"] = False
+                    self.input_state &= ~INPUT_RIGHT
+
+    def take_input(self):
+        """The inputs of the next step, the presses are consumed and the held keys stay"""
+        inputs = self.input_state
+        self.input_state &= INPUT_HELD
+        return inputs
+
+    def apply_input(self, inputs):
+        if inputs & INPUT_RESTART and self.game_end_state == "ended":
+            self.restart_level()
+        self.player.set_movement("left", inputs & INPUT_LEFT)
+        self.player.set_movement("right", inputs & INPUT_RIGHT)
+        if inputs & INPUT_JUMP and self.player.on_ground():
+            self.player.velocity.y = -8
+        if inputs & INPUT_JUMP_RELEASE and self.player.velocity.y < 0:
+            # self.player.velocity.y = -1 * self.player.velocity.y
+            self.player.velocity.y = 0
+
     def update(self):
-        # print(self.particle_list)
-        self.player.update()
-        for enemy in self.enemy_list.copy():
-            enemy.update()
-            if enemy.death:
-                self.enemy_list.remove(enemy)
-            elif enemy.dying:
-                # That means if the enemy is dying you will not be harmed
-                pass
-            elif enemy.rect.colliderect(self.player.rect):
-            # check collision with enemy, and make sure it either hits the player or the mob
-                self.handle_enemy_collision(enemy)
+        profiler = self.game.profiler
+        if self.tilemap.streaming:
+            with profiler.scope("update/streaming"):
+                self.stream_chunks()
+        with profiler.scope("update/player"):
+            self.player.update()
+            self.player_in_attack_range = set(self.attack_grid.query(self.player.rect))
+
+        with profiler.scope("update/enemies"):
+            self.awake_enemies = self.find_awake_enemies()
+            for enemy in self.awake_enemies:
+                # Mobs that just woke up weren't refreshed by step
+                enemy.previous_pos.update(enemy.pos)
+                enemy.update()
+                if enemy.death:
+                    self.killed_spawns.add(enemy.spawn_cell)
+                    self.remove_enemy(enemy)
+                else:
+                    self.mob_grid.update(enemy)
+                    self.attack_grid.update(enemy)
+
+            # Mobs only move themselves, so testing the player once after all of them moved gives the same hits in the same order
+            touching = set(self.mob_grid.query(self.player.rect))
+            if touching:
+                for enemy in self.enemy_list:
+                    # That means if the enemy is dying you will not be harmed
+                    if enemy in touching and not enemy.dying:
+                        # check collision with enemy, and make sure it either hits the player or the mob
+                        self.handle_enemy_collision(enemy)
         
-        for particle in self.particle_list.copy():
-            particle.update()
-            if particle.radius <= 0:
-                self.particle_list.remove(particle)
+        with profiler.scope("update/particles"):
+            self.particles.update()
         
-        for projectile in self.enemy_projectiles.copy():
-            projectile.update()
-            if self.player.rect.colliderect(projectile.rect) and not self.player.hit:
-                self.player.health -= 1
-                self.player.animation_index = 0
-                self.player.hit = True
-                self.enemy_projectiles.remove(projectile)
-                for i in range(36):
-                    angle = i * (2 * math.pi / 36)
-                    speed = 1
-                    self.particle_list.append(Ba_Particle(self.game, self, projectile.pos, pygame.math.Vector2(random.random() * speed * math.cos(angle), random.random() * speed * math.sin(angle))))
+        with profiler.scope("update/projectiles"):
+            for projectile in self.enemy_projectiles.copy():
+                projectile.update()
+                # Projectiles that hit a wall were released by their own update
+                if projectile.pool is not None:
+                    self.projectile_grid.update(projectile)
+            hits = set(self.projectile_grid.query(self.player.rect))
+            if hits:
+                for projectile in self.enemy_projectiles.copy():
+                    if projectile in hits and not self.player.hit:
+                        self.player.health -= 1
+                        self.player.animation_index = 0
+                        self.player.hit = True
+                        self.particles.ba_burst(projectile.pos, 1)
+                        self.remove_projectile(projectile)
 
         # General death check - triggers from any source (enemies, projectiles, etc.)
         if self.player.health <= 0 and self.game_end_state == "alive":
             self.trigger_game_end("death")
 
+
+    def simulation_rect(self):
+        return pygame.Rect(math.floor(self.scroll.x), math.floor(self.scroll.y), self.view_size[0], self.view_size[1]).inflate(self.simulation_margin * 2, self.simulation_margin * 2)
+
+    def find_awake_enemies(self):
+        """Enemies overlapping the simulation rect in enemy_list order, sleeping ones keep their state until they are back in range"""
+        if self.simulation_margin is None:
+            return self.enemy_list.copy()
+        awake = set(self.mob_grid.query(self.simulation_rect()))
+        return [enemy for enemy in self.enemy_list if enemy in awake]
+
+    def add_projectile(self, projectile):
+        self.enemy_projectiles.append(projectile)
+        self.projectile_grid.insert(projectile, projectile.rect)
+
+    def remove_projectile(self, projectile):
+        self.enemy_projectiles.remove(projectile)
+        self.projectile_grid.remove(projectile)
+        projectile.pool.release(projectile)
+
+    def remove_enemy(self, enemy):
+        self.enemy_list.remove(enemy)
+        self.mob_grid.remove(enemy)
+        self.attack_grid.remove(enemy)
+
+    def pool_stats(self):
+        """High water marks of the projectile pools and the particle system"""
+        stats = {cls.__name__: pool.stats() for cls, pool in self.projectile_pools.items()}
+        stats["particles"] = {"active": len(self.particles), "high_water": self.particles.high_water}
+        return stats
                 
     def handle_enemy_collision(self, enemy):
         if self.player.velocity.y >= 0 and abs(self.player.rect.bottom - enemy.rect.top) < 8:
@@ -164,8 +307,7 @@ class Level:
             enemy.health -= 1
             if enemy.health <= 0:
                 # self.create_death_particles((enemy.rect.centerx, enemy.rect.bottom))
-                for i in range(50):
-                  self.particle_list.append(Death_Particle(self.game, self, (enemy.rect.centerx, enemy.rect.bottom)))
+                self.particles.death_burst((enemy.rect.centerx, enemy.rect.bottom))
             self.player.velocity.y = -5
         elif not self.player.hit:
             self.player.health -= 1
@@ -207,15 +349,25 @@ class Level:
         
         # Clear all game objects
         self.enemy_list.clear()
+        self.mob_grid.clear()
+        self.attack_grid.clear()
+        self.projectile_grid.clear()
+        self.player_in_attack_range = set()
+        self.awake_enemies = []
         self.attack_list.clear()
-        self.particle_list.clear()
+        self.particles.clear()
+        for projectile in self.enemy_projectiles:
+            projectile.pool.release(projectile)
         self.enemy_projectiles.clear()
         
         # Reload level data
-        self.tilemap = Tilemap(self.game, self.level_name)
+        self.killed_spawns.clear()
+        self.stream_center = None
+        self.tilemap = Tilemap(self.game, self.level_name, self.tilemap.streaming)
         self.load_player()
         self.load_camera_borders()
         self.tile_surface = self.draw_tiles()
+        self.spawn_entities()
         
         # Reset player
         self.player.health = self.player.max_health
@@ -225,8 +377,8 @@ class Level:
     def render_death_screen(self):
         """Render the game end screen overlay (death or victory)"""
         if self.game_end_state == "ended":
-            # Create semi-transparent overlay
-            overlay = pygame.Surface((self.game.width, self.game.height))
+            # Semi-transparent overlay
+            overlay = self.game_end_overlay
             overlay.set_alpha(200)  # Semi-transparent
             
             # Set color and text based on game end type
@@ -256,7 +408,7 @@ class Level:
             self.game.display.blit(menu_text, menu_rect)
         elif self.game_end_state == "ending" and self.fade_alpha > 0:
             # Fade overlay during animation
-            overlay = pygame.Surface((self.game.width, self.game.height))
+            overlay = self.game_end_overlay
             overlay.set_alpha(self.fade_alpha)
             
             # Set color based on game end type
@@ -272,43 +424,47 @@ class Level:
     
 
 
-    def render(self, font):
-        self.render_background()
-        self.draw_tilemap()
-        for enemy in self.enemy_list:
-            # # for seeing attack_rect_range
-            # pygame.draw.rect(self.surface, "white", enemy.attack_range_rect.move(-self.scroll.x, -self.scroll.y))
-            # #
-            ## for seeing hitboxes
-            # pygame.draw.rect(self.surface, "blue", enemy.rect.move(-self.scroll.x, -self.scroll.y))
-            ##
-
-            enemy.render()
-
-        for particle in self.particle_list:
-            particle.render()
-
-        for projectile in self.enemy_projectiles.copy():
-            projectile.render()
-
-        self.player.render()
+    def render(self, alpha = 1):
+        """Draws the level alpha of the way from the previous simulation step to the current one"""
+        profiler = self.game.profiler
+        # The camera keeps moving after the level ended, the entities, particles and projectiles stop
+        self.render_alpha = alpha if self.game_end_state == "alive" else 1
+        self.render_scroll = self.scroll if alpha >= 1 else self.previous_scroll.lerp(self.scroll, alpha)
+        with profiler.scope("render/background"):
+            self.render_background()
+        with profiler.scope("render/tiles"):
+            self.draw_tilemap()
+        with profiler.scope("render/entities"):
+            # Sleeping mobs are outside the view, only the ones simulated this tick can be on screen
+            for enemy in self.awake_enemies:
+                # # for seeing attack_rect_range
+                # pygame.draw.rect(self.surface, "white", enemy.attack_range_rect.move(-self.scroll.x, -self.scroll.y))
+                # #
+                ## for seeing hitboxes
+                # pygame.draw.rect(self.surface, "blue", enemy.rect.move(-self.scroll.x, -self.scroll.y))
+                ##
+
+                enemy.render()
+
+        with profiler.scope("render/particles"):
+            self.particles.render(self.render_batch, self.render_scroll, self.render_alpha)
+            for projectile in self.enemy_projectiles:
+                projectile.render()
+            self.render_batch.flush(self.surface)
+
+        with profiler.scope("render/entities"):
+            self.player.render()
         self.render_hearts()
 
-
-
-        self.game.display.blit(pygame.transform.scale_by(self.surface, self.render_scale), (0,0))
-
-        # self.game.display.blit(self.surface, (0,0))
-        # text = font.render(str(int(self.game.clock.get_fps())),True, "white", pygame.SRCALPHA)
-        text = font.render(str(int(self.player.velocity.y)),True, "white", pygame.SRCALPHA)
-
-        # print(self.player.velocity)
-        self.game.display.blit(text, (self.game.width - text.get_width(), 0))
+        with profiler.scope("render/scale_flip"):
+            pygame.transform.scale(self.surface, self.game.display.get_size(), self.game.display)
         
         # Render death screen overlay
         self.render_death_screen()
+        self.game.profiler_overlay.render(self.game.display)
         
-        pygame.display.update()
+        with profiler.scope("render/scale_flip"):
+            pygame.display.update()
 
     def render_hearts(self):
         for heart, x_pos in enumerate(range(10,self.heart_width * self.player.max_health + 2 * self.player.max_health, self.heart_width + 2)):
@@ -318,40 +474,60 @@ class Level:
                 self.surface.blit(self.heart_img[1], (x_pos, 10))
 
     def render_background(self):
-        fix_x = ((self.player.pos.x / 2) // self.background_img_size[0]) * self.background_img_size[0]
-        fix_y = ((self.player.pos.y / 2) // self.background_img_size[1]) * self.background_img_size[1]
-        # print(fix_x)
-        # self.surface.blit(self.background_img, (fix_x - self.background_img_size[0] + self.scroll[0]* -0.5,self.scroll[1] * -0.5))
-        # self.surface.blit(self.background_img, (fix_x + self.scroll[0]* -0.5,self.scroll[1] * -0.5))
-        # self.surface.blit(self.background_img, (fix_x + self.scroll[0]* -0.5,-self.background_img_size[1] + self.scroll[1] * -0.5))
-        # self.surface.blit(self.background_img, (fix_x + self.background_img_size[0] + self.scroll[0]* -0.5,self.scroll[1] * -0.5))
-        self.surface.blit(self.background_img, (fix_x - self.background_img_size[0] + self.scroll[0]* -0.5, fix_y - self.background_img_size[1] + self.scroll[1] * -0.5))
+        self.background.render(self.surface, self.render_scroll)
     
     def draw_tiles(self):
-        cache_surface = pygame.surface.Surface(((self.tilemap.borders["right"] - self.tilemap.borders["left"]) * self.game.tile_size + self.game.tile_size, (self.tilemap.borders["bottom"] - self.tilemap.borders["top"]) * self.game.tile_size+ self.game.tile_size))
-        cache_surface.set_colorkey((0,0,0))
+        # The tile graphics are baked lazily per chunk by Cache_tiles
+        return Cache_tiles(self.game, self)
+
+    def spawn_entities(self):
+        if self.tilemap.streaming:
+            self.stream_chunks()
+            return
+        borders = self.tilemap.borders
         for layer in self.tilemap.layer_list:
-            for x in range(self.tilemap.borders["left"], self.tilemap.borders["right"]):
-                for y in range(self.tilemap.borders["top"] ,self.tilemap.borders["bottom"]):
-                    loc = str(x) + ';' + str(y)
-                    if loc in layer["grid"]:
-                        if layer["grid"][loc]["element"] not in NO_SHOW_TILES and layer["grid"][loc]["world_element_type"] != "entities" :
-                            element_surface_list = self.game.static_assets[f'{layer["grid"][loc]["world_element_type"]}/{layer["grid"][loc]["element"]}']
-                            element_variance = layer["grid"][loc]["variance"]
-                            element_pos = layer["grid"][loc]["pos"]
-                            cache_surface.blit(element_surface_list[element_variance], (element_pos[0] * self.game.tile_size - self.tilemap.borders["left"] * self.game.tile_size, element_pos[1] * self.game.tile_size - self.tilemap.borders["top"] * self.game.tile_size))
-                        elif layer["grid"][loc]["world_element_type"] == "entities":
-                            pos = pygame.math.Vector2(layer["grid"][loc]["pos"][0] * self.game.tile_size, layer["grid"][loc]["pos"][1] * self.game.tile_size)
-                            self.enemy_list.append(get_mob_class(layer["grid"][loc]["element"])(self.game, self, pos , layer["grid"][loc]["element"], self.player))
-     #self.player = Player(self.game,self, pygame.math.Vector2(layer["grid"][key]["pos"][0] * (self.game.tile_size), layer["grid"][key]["pos"][1] * (self.game.tile_size)), "player")
-
-        return Cache_tiles(self.game, self, cache_surface)
-
-            
-        
+            # Only the occupied cells inside the borders are visited, sorted column by column like the old border scan
+            spawns = []
+            for x, y, element_id, variance in layer["grid"].tiles_in_rect(borders["left"], borders["top"], borders["right"], borders["bottom"]):
+                world_element_type, element = element_name(element_id)
+                if world_element_type == "entities":
+                    spawns.append((x, y, element))
+            for x, y, element in sorted(spawns):
+                self.spawn_mob(element, x, y)
+
+    def spawn_mob(self, element, x, y):
+        pos = pygame.math.Vector2(x * self.game.tile_size, y * self.game.tile_size)
+        enemy = get_mob_class(element)(self.game, self, pos , element, self.player)
+        enemy.spawn_cell = (x, y)
+        self.enemy_list.append(enemy)
+        self.mob_grid.insert(enemy, enemy.rect)
+        self.attack_grid.insert(enemy, enemy.attack_range_rect)
+
+    def stream_chunks(self):
+        """Pages the level in around the player, spawning the mobs of new chunks and removing the ones of dropped chunks"""
+        center = chunk_key(int(self.player.rect.centerx // self.game.tile_size), int(self.player.rect.centery // self.game.tile_size))
+        if center == self.stream_center:
+            return
+        self.stream_center = center
+        loaded, dropped = self.tilemap.stream_around(center, STREAM_RADIUS)
+        for key in dropped:
+            self.tile_surface.drop(key)
+        if dropped:
+            # Mobs go with the chunk they are in now, the one they spawned in can still be loaded or long gone
+            tile_size = self.game.tile_size
+            for enemy in [enemy for enemy in self.enemy_list if chunk_key(int(enemy.rect.centerx // tile_size), int(enemy.rect.centery // tile_size)) not in self.tilemap.loaded_chunks]:
+                self.remove_enemy(enemy)
+        # A mob that walked out of its spawn chunk outlives it, its spawner reloading mustn't add a second one
+        alive_spawns = {enemy.spawn_cell for enemy in self.enemy_list}
+        for key in loaded:
+            for layer in self.tilemap.layer_list:
+                for x, y, element_id, variance in layer["grid"].chunk_tiles(key):
+                    world_element_type, element = element_name(element_id)
+                    if world_element_type == "entities" and (x, y) not in self.killed_spawns and (x, y) not in alive_spawns and self.tilemap.borders["left"] <= x < self.tilemap.borders["right"] and self.tilemap.borders["top"] <= y < self.tilemap.borders["bottom"]:
+                        self.spawn_mob(element, x, y)
 
     def draw_tilemap(self):
-        self.tile_surface.render(self.scroll)
+        self.tile_surface.render(self.surface, self.render_scroll, self.view_size)
     
 
 
@@ -377,14 +553,31 @@ class Level:
         self.camera_borders["right"] = self.tilemap.borders["right"] * self.game.tile_size - self.game.width / (2* self.render_scale)
 
 
-class Cache_tiles:
-    def __init__(self, game, level, surface) -> None:
-        self.game = game
+class Cache_tiles(Chunk_render_cache):
+    """Level tiles baked per chunk and clipped to the level borders, only the chunks in view are blitted"""
+    def __init__(self, game, level) -> None:
+        super().__init__(game)
         self.level = level
-        self.surface= surface
-        # self.rect = surface.get_rect(topleft = (self.level.tilemap.borders["left"] * self.game.tile_size, self.level.tilemap.borders["top"] * self.game.tile_size))
-        self.pos = pygame.math.Vector2(self.level.tilemap.borders["left"] * self.game.tile_size, self.level.tilemap.borders["top"] * self.game.tile_size)
-    
-    def render(self, scroll):
-        self.level.surface.blit(self.surface, self.pos - scroll)
-
+        self.borders = self.level.tilemap.borders
+
+    def chunk_has_content(self, key):
+        chunk_left = key[0] << CHUNK_SHIFT
+        chunk_top = key[1] << CHUNK_SHIFT
+        if chunk_left >= self.borders["right"] or chunk_left + CHUNK_SIZE <= self.borders["left"] or chunk_top >= self.borders["bottom"] or chunk_top + CHUNK_SIZE <= self.borders["top"]:
+            return False
+        for layer in self.level.tilemap.layer_list:
+            if key in layer["grid"].chunks:
+                return True
+        return False
+
+    def bake_chunk(self, key, surface):
+        # The chunk clipped to the borders, only its occupied cells get visited
+        left = max(key[0] << CHUNK_SHIFT, self.borders["left"])
+        top = max(key[1] << CHUNK_SHIFT, self.borders["top"])
+        right = min((key[0] + 1) << CHUNK_SHIFT, self.borders["right"])
+        bottom = min((key[1] + 1) << CHUNK_SHIFT, self.borders["bottom"])
+        for layer in self.level.tilemap.layer_list:
+            for x, y, element_id, variance in layer["grid"].tiles_in_rect(left, top, right, bottom):
+                world_element_type, element = element_name(element_id)
+                if element not in NO_SHOW_TILES and world_element_type != "entities":
+                    surface.blit(self.game.static_assets[f'{world_element_type}/{element}'][variance], ((x & CHUNK_MASK) * self.game.tile_size, (y & CHUNK_MASK) * self.game.tile_size))
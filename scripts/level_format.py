@@ -0,0 +1,200 @@
+import json, mmap, os, struct, sys, zlib
+from array import array
+from scripts.tile_grid import *
+
+# Binary level layout, all little endian:
+#   magic "PLV1", u32 meta length, meta json (borders, backgrounds, layer flags, off grid elements, spawn)
+#   u32 string count, then per string: u16 length + utf8 "world_element_type/element"
+#   per layer: u32 chunk count, chunk directory of (i32 chunk_x, i32 chunk_y, u32 record length),
+#              then one zlib compressed record per chunk: CHUNK_AREA u16 element ids + CHUNK_AREA u8 variances
+MAGIC = b"PLV1"
+LITTLE_ENDIAN = sys.byteorder == "little"
+
+def is_binary_level(path):
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+def read_json_level(path):
+    with open(path, "r") as file:
+        return json.load(file)
+
+def write_json_level(path, level_dict):
+    with open(path, "w") as file:
+        json.dump(level_dict, file)
+
+def level_dict_to_layers(level_dict):
+    """Turns the layer dicts of a json level into layers holding Tile_grids, returns (layer_list, player_spawn)"""
+    player_spawn = None
+    for layer in level_dict["layer_list"]:
+        for tile in layer["grid"].values():
+            # The chunked grid has no insertion order so the spawner is picked here, the last one in the file wins
+            if tile["element"] == "player_spawner":
+                player_spawn = tuple(tile["pos"])
+        layer["grid"] = Tile_grid.from_json(layer["grid"])
+    return level_dict["layer_list"], player_spawn
+
+def layers_to_level_dict(layer_list, background_list, borders, player_spawn = None):
+    # The chunked grids only exist in memory, on disk every layer keeps the "x;y" keyed json dicts
+    layer_list = [dict(layer, grid = layer["grid"].to_json()) for layer in layer_list]
+    if player_spawn is not None:
+        # Written last so the same spawner wins when the level is loaded again
+        spawn_key = str(player_spawn[0]) + ";" + str(player_spawn[1])
+        for layer in layer_list:
+            if spawn_key in layer["grid"] and layer["grid"][spawn_key]["element"] == "player_spawner":
+                layer["grid"][spawn_key] = layer["grid"].pop(spawn_key)
+    return {"layer_list": layer_list, "background_list": background_list, "borders": borders}
+
+def write_binary_level(path, layer_list, background_list, borders, player_spawn = None):
+    used_ids = sorted({element for layer in layer_list for chunk in layer["grid"].chunks.values() for element in chunk.elements if element})
+    # File local string table, index 0 stays the empty cell
+    file_ids = {element: index + 1 for index, element in enumerate(used_ids)}
+    translate = [0] * len(ELEMENT_NAMES)
+    for element, file_id in file_ids.items():
+        translate[element] = file_id
+
+    meta = {"background_list": background_list, "borders": borders, "player_spawn": player_spawn,
+            "layers": [{key: value for key, value in layer.items() if key != "grid"} for layer in layer_list]}
+    meta_bytes = json.dumps(meta).encode()
+    parts = [MAGIC, struct.pack("<I", len(meta_bytes)), meta_bytes, struct.pack("<I", len(used_ids))]
+    for element in used_ids:
+        name = "/".join(ELEMENT_NAMES[element]).encode()
+        parts.append(struct.pack("<H", len(name)))
+        parts.append(name)
+
+    for layer in layer_list:
+        keys = sorted(layer["grid"].chunks)
+        records = []
+        for key in keys:
+            chunk = layer["grid"].chunks[key]
+            elements = array("H", [translate[element] for element in chunk.elements])
+            if not LITTLE_ENDIAN:
+                elements.byteswap()
+            records.append(zlib.compress(elements.tobytes() + chunk.variances.tobytes()))
+        parts.append(struct.pack("<I", len(keys)))
+        parts.append(b"".join(struct.pack("<iiI", key[0], key[1], len(record)) for key, record in zip(keys, records)))
+        parts.extend(records)
+
+    with open(path, "wb") as file:
+        file.write(b"".join(parts))
+
+
+class Binary_level:
+    """Parsed header of a binary level, the chunk records stay compressed in the memoryview until read_chunk asks for them"""
+    def __init__(self, data) -> None:
+        self.data = memoryview(data)
+        if bytes(self.data[:len(MAGIC)]) != MAGIC:
+            raise ValueError("not a binary level")
+        offset = len(MAGIC)
+        meta_length, = struct.unpack_from("<I", self.data, offset)
+        offset += 4
+        self.meta = json.loads(bytes(self.data[offset:offset + meta_length]))
+        offset += meta_length
+
+        string_count, = struct.unpack_from("<I", self.data, offset)
+        offset += 4
+        # Maps the file local element ids onto the interned ids of this process
+        self.translate = [0]
+        for _ in range(string_count):
+            length, = struct.unpack_from("<H", self.data, offset)
+            offset += 2
+            world_element_type, element = bytes(self.data[offset:offset + length]).decode().split("/", 1)
+            offset += length
+            self.translate.append(element_id(world_element_type, element))
+        self.identity = self.translate == list(range(len(self.translate)))
+
+        # One {chunk key: (record offset, record length)} directory per layer
+        self.directories = []
+        for _ in self.meta["layers"]:
+            chunk_count, = struct.unpack_from("<I", self.data, offset)
+            offset += 4
+            entries = struct.unpack_from("<" + "iiI" * chunk_count, self.data, offset)
+            offset += chunk_count * 12
+            directory = {}
+            for index in range(chunk_count):
+                length = entries[index * 3 + 2]
+                directory[(entries[index * 3], entries[index * 3 + 1])] = (offset, length)
+                offset += length
+            self.directories.append(directory)
+
+    def read_chunk(self, layer_index, key):
+        offset, length = self.directories[layer_index][key]
+        record = memoryview(zlib.decompress(self.data[offset:offset + length]))
+        chunk = Tile_chunk()
+        chunk.elements = array("H")
+        chunk.elements.frombytes(record[:CHUNK_AREA * 2])
+        if not LITTLE_ENDIAN:
+            chunk.elements.byteswap()
+        if not self.identity:
+            translate = self.translate
+            chunk.elements = array("H", [translate[element] for element in chunk.elements])
+        chunk.variances = array("B")
+        chunk.variances.frombytes(record[CHUNK_AREA * 2:])
+        chunk.occupied = {index for index, element in enumerate(chunk.elements) if element}
+        return chunk
+
+    def load_layers(self, streaming = False):
+        """Returns (layer_list, player_spawn), when streaming the grids start empty and chunks are read on demand"""
+        layer_list = []
+        for layer_index, layer_meta in enumerate(self.meta["layers"]):
+            grid = Tile_grid()
+            if not streaming:
+                for key in self.directories[layer_index]:
+                    grid.add_chunk(key, self.read_chunk(layer_index, key))
+            layer_list.append(dict(layer_meta, grid = grid))
+        player_spawn = tuple(self.meta["player_spawn"]) if self.meta["player_spawn"] is not None else self.find_element("player_spawner")
+        return layer_list, player_spawn
+
+    def find_element(self, element):
+        """Position of the first tile named element in the chunk records, None when there is none"""
+        for layer_index, directory in enumerate(self.directories):
+            for key in directory:
+                chunk = self.read_chunk(layer_index, key)
+                for index in sorted(chunk.occupied):
+                    if element_name(chunk.elements[index])[1] == element:
+                        return ((key[0] << CHUNK_SHIFT) | (index & CHUNK_MASK), (key[1] << CHUNK_SHIFT) | (index >> CHUNK_SHIFT))
+        return None
+
+
+def read_binary_level(path, mapped = False):
+    with open(path, "rb") as file:
+        if mapped:
+            # Mapped levels are paged in by the os, only the chunks actually read become resident
+            return Binary_level(mmap.mmap(file.fileno(), 0, access = mmap.ACCESS_READ))
+        return Binary_level(file.read())
+
+def convert_level(source, destination, to_binary = True):
+    if is_binary_level(source):
+        binary_level = read_binary_level(source)
+        layer_list, player_spawn = binary_level.load_layers()
+        background_list, borders = binary_level.meta["background_list"], binary_level.meta["borders"]
+    else:
+        level_dict = read_json_level(source)
+        layer_list, player_spawn = level_dict_to_layers(level_dict)
+        background_list, borders = level_dict["background_list"], level_dict["borders"]
+
+    if to_binary:
+        write_binary_level(destination, layer_list, background_list, borders, player_spawn)
+    else:
+        write_json_level(destination, layers_to_level_dict(layer_list, background_list, borders, player_spawn))
+
+
+if __name__ == "__main__":
+    # python -m scripts.level_format [--json] [--out directory] level_path ...
+    # Converts levels to the binary format (back to json with --json), in place unless an output directory is given
+    args = sys.argv[1:]
+    to_binary = "--json" not in args
+    args = [arg for arg in args if arg != "--json"]
+    out_directory = None
+    if "--out" in args:
+        index = args.index("--out")
+        out_directory = args[index + 1]
+        del args[index:index + 2]
+        os.makedirs(out_directory, exist_ok = True)
+    if not args:
+        print("usage: python -m scripts.level_format [--json] [--out directory] level_path ...")
+        sys.exit(1)
+    for path in args:
+        destination = os.path.join(out_directory, os.path.basename(path)) if out_directory else path
+        size_before = os.path.getsize(path)
+        convert_level(path, destination, to_binary)
+        print(f"{path} -> {destination}: {size_before} -> {os.path.getsize(destination)} bytes")
@@ -1,5 +1,26 @@
 import pygame, sys, os, json
+from collections import OrderedDict
 from scripts.utils import *
+from scripts.background import Parallax_background
+
+TEXT_CACHE_SIZE = 64
+
+class Text_cache:
+    """Rendered text surfaces keyed by (font, text, color), labels only get rendered again when they change"""
+    def __init__(self, max_size = TEXT_CACHE_SIZE) -> None:
+        self.max_size = max_size
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = font.render(text, True, color)
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last = False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface
 
 class MenuButton:
     def __init__(self, game, rect, text, action) -> None:
@@ -17,6 +38,11 @@ class MenuButton:
         self.hover_color = (150, 150, 150)
         self.clicked_color = (200, 200, 200)
         self.text_color = (255, 255, 255)
+
+        # Made again only when the scaled size or the state colour changes
+        self.button_surface = None
+        self.button_color = None
+        self.text_surface = None
         
     def update(self):
         # Update scale based on state
@@ -44,19 +70,23 @@ class MenuButton:
         else:
             color = self.normal_color
         
-        # Create semi-transparent surface for button background
-        button_surface = pygame.Surface((scaled_rect.width, scaled_rect.height))
-        button_surface.set_alpha(180)  # Semi-transparent (180/255 = ~70% opacity)
-        button_surface.fill(color)
+        # Semi-transparent surface for button background
+        button_surface = self.button_surface
+        if button_surface is None or button_surface.get_size() != scaled_rect.size or self.button_color != color:
+            button_surface = self.button_surface = pygame.Surface(scaled_rect.size)
+            button_surface.set_alpha(180)  # Semi-transparent (180/255 = ~70% opacity)
+            button_surface.fill(color)
+            self.button_color = color
         
         # Draw button
         self.game.display.blit(button_surface, scaled_rect)
         pygame.draw.rect(self.game.display, (255, 255, 255), scaled_rect, 2)
         
-        # Draw text
-        text = font.render(self.text, True, self.text_color)
-        text_rect = text.get_rect(center=scaled_rect.center)
-        self.game.display.blit(text, text_rect)
+        # Draw text, the label never changes so it is rendered once
+        if self.text_surface is None:
+            self.text_surface = font.render(self.text, True, self.text_color)
+        text_rect = self.text_surface.get_rect(center=scaled_rect.center)
+        self.game.display.blit(self.text_surface, text_rect)
 
 class Menu:
     def __init__(self, game) -> None:
@@ -65,6 +95,7 @@ class Menu:
         self.buttons = []
         self.font = pygame.font.SysFont('Arial', 32)
         self.title_font = pygame.font.SysFont('Arial', 48, bold=True)
+        self.text_cache = Text_cache()
         
         self.menu_options = {
             "main": ["Play Game", "Level Editor", "Exit"]
@@ -121,12 +152,18 @@ class Menu:
         self.background_speed = 0.5  # Pixels per frame
         self.background_image = None
         self.background_img_size = (0, 0)
+        self.background = None
+        self.background_scale = 1
         self.make_background_img()
+        # Input box of the naming dialog
+        self.input_surface = pygame.Surface((self.button_width, self.button_height))
+        self.input_surface.set_alpha(180)  # Semi-transparent (180/255 = ~70% opacity)
+        self.input_surface.fill((100, 100, 100))  # Same as MenuButton.normal_color
         
         self.create_buttons()
         
     def make_background_img(self):
-        """Create a tiled background image - 1 row, 3 columns"""
+        """Loads the background scaled to the screen height once, with the darkening overlay baked in"""
         try:
             # Load the ellinia background
             background_path = "assets/backgrounds/ellinia.jpeg"
@@ -138,13 +175,21 @@ class Menu:
                 return
             
             img_size = img.get_size()
-            new_img = pygame.Surface((img_size[0] * 3, img_size[1]))
+            # Scale image to fit screen height while maintaining aspect ratio
+            self.background_scale = self.game.height / img_size[1]
+            new_img = pygame.transform.scale(img, (int(img_size[0] * self.background_scale), self.game.height))
+
+            # Semi-transparent overlay to make text more readable, applied once instead of every frame
+            overlay = pygame.Surface(new_img.get_size())
+            overlay.set_alpha(100)
+            overlay.fill((0, 0, 0))
+            new_img.blit(overlay, (0, 0))
 
-            for i in range(3):
-                new_img.blit(img, (i*img_size[0], 0))
-            
             self.background_image = new_img
             self.background_img_size = img_size
+            # Repeated horizontally, only the one or two copies on screen get drawn
+            self.background = Parallax_background()
+            self.background.add_layer(new_img, (1, 0))
             
         except Exception as e:
             print(f"Error loading background: {e}")
@@ -161,28 +206,8 @@ class Menu:
     
     def render_background(self):
         """Render the scrolling background with seamless looping"""
-        if self.background_image:
-            # Scale image to fit screen height while maintaining aspect ratio
-            scale_factor = self.game.height / self.background_img_size[1]
-            scaled_width = int(self.background_img_size[0] * 3 * scale_factor)
-            scaled_height = self.game.height
-            
-            # Scale the image
-            scaled_image = pygame.transform.scale(self.background_image, (scaled_width, scaled_height))
-            
-            # Calculate positions for seamless scrolling
-            x1 = int(self.background_scroll * scale_factor)
-            x2 = x1 + scaled_width
-            
-            # Draw the background images to ensure no black screen
-            self.game.display.blit(scaled_image, (x1, 0))
-            self.game.display.blit(scaled_image, (x2, 0))
-            
-            # Add a semi-transparent overlay to make text more readable
-            overlay = pygame.Surface((self.game.width, self.game.height))
-            overlay.set_alpha(100)  # Semi-transparent
-            overlay.fill((0, 0, 0))  # Black overlay
-            self.game.display.blit(overlay, (0, 0))
+        if self.background:
+            self.background.render(self.game.display, (-self.background_scroll * self.background_scale, 0))
     
     def get_available_levels(self):
         """Get all level files from the levels directory"""
@@ -473,7 +498,7 @@ class Menu:
         self.render_background()
         
         # Title
-        title_text = self.title_font.render("Platformer Game", True, self.title_color)
+        title_text = self.text_cache.render(self.title_font, "Platformer Game", self.title_color)
         title_rect = title_text.get_rect(center=(self.game.width // 2, 60))
         self.game.display.blit(title_text, title_rect)
         
@@ -487,13 +512,13 @@ class Menu:
         
         # Instructions
         if self.current_menu == "main":
-            instruction_text = self.font.render("Use mouse to navigate, ESC to go back", True, (200, 200, 200))
+            instruction_text = self.text_cache.render(self.font, "Use mouse to navigate, ESC to go back", (200, 200, 200))
         elif self.current_menu == "level_select":
-            instruction_text = self.font.render("Click a level to start, use Previous/Next to navigate pages", True, (200, 200, 200))
+            instruction_text = self.text_cache.render(self.font, "Click a level to start, use Previous/Next to navigate pages", (200, 200, 200))
         elif self.current_menu == "naming_dialog":
-            instruction_text = self.font.render("Enter level name, ESC to cancel", True, (200, 200, 200))
+            instruction_text = self.text_cache.render(self.font, "Enter level name, ESC to cancel", (200, 200, 200))
         else:
-            instruction_text = self.font.render("", True, (200, 200, 200)) # No specific instructions for other menus
+            instruction_text = self.text_cache.render(self.font, "", (200, 200, 200)) # No specific instructions for other menus
         instruction_rect = instruction_text.get_rect(center=(self.game.width // 2, self.game.height - 40))
         self.game.display.blit(instruction_text, instruction_rect)
         
@@ -502,7 +527,7 @@ class Menu:
     def render_naming_input(self):
         """Render the naming input box for the naming_dialog state"""
         # Title for naming dialog
-        title_text = self.title_font.render("Enter Level Name", True, (250, 250, 250))
+        title_text = self.text_cache.render(self.title_font, "Enter Level Name", (250, 250, 250))
         title_rect = title_text.get_rect(center=(self.game.width // 2, 200))
         self.game.display.blit(title_text, title_rect)
         
@@ -514,26 +539,21 @@ class Menu:
             self.button_height
         )
         
-        # Create semi-transparent surface for input box background
-        input_surface = pygame.Surface((input_rect.width, input_rect.height))
-        input_surface.set_alpha(180)  # Semi-transparent (180/255 = ~70% opacity)
-        input_surface.fill((100, 100, 100))  # Same as MenuButton.normal_color
-        
         # Draw input box
-        self.game.display.blit(input_surface, input_rect)
+        self.game.display.blit(self.input_surface, input_rect)
         pygame.draw.rect(self.game.display, (255, 255, 255), input_rect, 2)
         
         # Input text with cursor
-        input_text = self.font.render(self.dialog_text + "|", True, (255, 255, 255))
+        input_text = self.text_cache.render(self.font, self.dialog_text + "|", (255, 255, 255))
         input_text_rect = input_text.get_rect(midleft=(input_rect.x + 15, input_rect.centery))
         self.game.display.blit(input_text, input_text_rect)
         
         # Instructions
-        instruction_text = self.font.render(f"Max {self.max_name_length} characters", True, (200, 200, 200))
+        instruction_text = self.text_cache.render(self.font, f"Max {self.max_name_length} characters", (200, 200, 200))
         instruction_rect = instruction_text.get_rect(center=(self.game.width // 2, 380))
         self.game.display.blit(instruction_text, instruction_rect)
         
-        instruction_text2 = self.font.render("Press ENTER to create", True, (200, 200, 200))
+        instruction_text2 = self.text_cache.render(self.font, "Press ENTER to create", (200, 200, 200))
         instruction_rect2 = instruction_text2.get_rect(center=(self.game.width // 2, 410))
         self.game.display.blit(instruction_text2, instruction_rect2)
     
@@ -1,16 +1,17 @@
 import pygame
-from scripts.entities import Mob
+from scripts.entities import Mob, COLLIDE_LEFT, COLLIDE_RIGHT
 from scripts.projectiles import *
 
 class Mushroom(Mob):
-    def __init__(self, game, level, pos, entity_name, player) -> None:
-        self.size = (30,28)
-        super().__init__(game, level, pos, entity_name, player)
-        self.speed = 1
+    size = (30,28)
+    speed = 1
+    animation_speed = {"idle": 0.15,"run": 0.25,"jump": 0,"fall": 0,"hit": 0.10, "death": 0.10}
+    draw_offset = pygame.math.Vector2(0,6)
 
-        self.animation_speed = {"idle": 0.15,"run": 0.25,"jump": 0,"fall": 0,"hit": 0.10, "death": 0.10}
-        self.draw_offset = pygame.math.Vector2(0,6)
+    __slots__ = ()
 
+    def __init__(self, game, level, pos, entity_name, player) -> None:
+        super().__init__(game, level, pos, entity_name, player)
         self.health = 1
 
     def handle_x_velocity(self):
@@ -20,7 +21,7 @@ class Mushroom(Mob):
                 self.movement_by_flip_direction()
 
         else:
-            if self.collisions["left"] or self.collisions["right"] or not self.level.tilemap.solid_check((self.rect.centerx + 10, self.pos[1] + 35)) or not self.level.tilemap.solid_check((self.rect.centerx - 10, self.pos[1] + 35)):
+            if self.collision_flags & (COLLIDE_LEFT | COLLIDE_RIGHT) or not self.level.tilemap.solid_check((self.rect.centerx + 10, self.pos[1] + 35)) or not self.level.tilemap.solid_check((self.rect.centerx - 10, self.pos[1] + 35)):
                 self.flip = not self.flip
                 self.velocity.x = 0
                 self.animation_index = 0
@@ -28,11 +29,14 @@ class Mushroom(Mob):
                 self.movement_by_flip_direction()
 
 class Ba(Mob):
+    size = (32,32)
+    gravity = 0
+    animation_speed = {"idle": 0.10,"death": 0.10} #{"idle": 0.15,"run": 0.25,"jump": 0,"fall": 0,"hit": 0.10, "death": 0.10}
+
+    __slots__ = ()
+
     def __init__(self, game, level, pos, entity_name, player) -> None:
-        self.size = (32,32)
         super().__init__(game, level, pos, entity_name, player)
-        self.gravity = 0
-        self.animation_speed = {"idle": 0.10,"death": 0.10} #{"idle": 0.15,"run": 0.25,"jump": 0,"fall": 0,"hit": 0.10, "death": 0.10}
         self.attack_range_rect = pygame.rect.Rect(self.pos.x - self.game.tile_size * 4, self.pos.y, self.game.tile_size * 9, self.game.tile_size * 5)
 
     def handle_x_velocity(self):
@@ -43,7 +47,7 @@ class Ba(Mob):
     
 
     def attack(self):
-        self.level.enemy_projectiles.append(Ba_projectile(self.player, self.game,self.level,(self.rect.centerx, self.rect.bottom)))
+        self.level.add_projectile(self.level.projectile_pools[Ba_projectile].acquire(self.player, self.game,self.level,(self.rect.centerx, self.rect.bottom)))
                     
 
 
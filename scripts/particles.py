@@ -1,5 +1,18 @@
-import pygame
+import pygame, math
 import random
+from collections import OrderedDict
+from itertools import compress
+from operator import add, sub
+
+# Colour and glow of each particle kind, indexed by the kind stored per particle
+DEATH_PARTICLE = 0
+BA_PARTICLE = 1
+PARTICLE_COLORS = ["orange", "white"]
+GLOW_COLOR = (50,50,50)
+GLOW_SCALE = 1.4
+PARTICLE_FIELDS = ["x", "y", "previous_x", "previous_y", "vx", "vy", "radius", "shrink", "gravity", "kind"]
+GLOW_RADIUS_STEP = 0.25 # glow radii are rounded to this step so shrinking particles share sprites
+GLOW_CACHE_SIZE = 128
 
 def circle_surf(radius, color):
     surf = pygame.Surface((radius * 2 ,radius * 2))
@@ -7,46 +20,141 @@ def circle_surf(radius, color):
     surf.set_colorkey((0,0,0))
     return surf
 
-class Particle:
-    def __init__(self, game, level, pos) -> None:
-        self.game = game
-        self.level = level
-        self.pos = pygame.math.Vector2(pos[0], pos[1])
-        self.velocity = pygame.math.Vector2(0, 0)
-        self.radius = 1
-    def update(self):
-        pass
+class Glow_cache:
+    """Pre rendered circle_surf sprites keyed by (radius bucket, colour), the least recently used one is evicted past max_size"""
+    def __init__(self, max_size = GLOW_CACHE_SIZE, step = GLOW_RADIUS_STEP) -> None:
+        self.max_size = max_size
+        self.step = step
+        self.surfaces = OrderedDict()
 
-    def render(self):
-        pass
+    def get(self, radius, color):
+        """Returns (surface, bucket radius), blit it at center - bucket radius"""
+        bucket = round(radius / self.step)
+        key = (bucket, color)
+        surface = self.surfaces.get(key)
+        if surface is None:
+            surface = self.surfaces[key] = circle_surf(bucket * self.step, color)
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last = False)
+        else:
+            self.surfaces.move_to_end(key)
+        return surface, bucket * self.step
 
-class Death_Particle(Particle):
-    def __init__(self, game, level, pos) -> None:
-        super().__init__(game, level, pos)
-        self.velocity = pygame.math.Vector2(random.random() -0.5 ,random.random() -2)
-        self.radius = 5
+class Render_batch:
+    """Sprite blits of one frame grouped by blend mode, culled against the view and submitted with Surface.blits"""
+    def __init__(self, view_size, sprite_cache = None) -> None:
+        self.view_size = view_size
+        self.sprite_cache = sprite_cache if sprite_cache is not None else Glow_cache()
+        self.rect_sprites = {}
+        # special_flags -> [(surface, dest, area, special_flags)], flushed in flag order so plain blits go first
+        self.commands = {}
+        self.culled = 0
 
-    def update(self):
-        self.velocity.y += 0.05
-        self.pos.x += self.velocity.x
-        self.pos.y += self.velocity.y
-        self.radius -= 0.05
-    
-    def render(self,): 
-        pygame.draw.circle(self.level.surface, "orange", (self.pos[0] - self.level.scroll[0], self.pos[1] - self.level.scroll[1]), self.radius)
-        self.level.surface.blit(circle_surf(self.radius * 1.4 , (50,50,50)),(self.pos[0]- self.level.scroll[0]-self.radius * 1.4 , self.pos[1]- self.level.scroll[1]-self.radius * 1.4), special_flags = pygame.BLEND_RGB_ADD)
-
-class Ba_Particle(Particle):
-    def __init__(self, game, level, pos, velocity) -> None:
-        super().__init__(game, level, pos)
-        self.velocity = velocity
-        self.radius = 4
+    def add(self, sprite, x, y, special_flags = 0):
+        width, height = sprite.get_size()
+        if x + width <= 0 or y + height <= 0 or x >= self.view_size[0] or y >= self.view_size[1]:
+            self.culled += 1
+            return
+        commands = self.commands.get(special_flags)
+        if commands is None:
+            commands = self.commands[special_flags] = []
+        commands.append((sprite, (x, y), None, special_flags))
+
+    def circle(self, center, radius, color, special_flags = 0):
+        sprite, sprite_radius = self.sprite_cache.get(radius, color)
+        self.add(sprite, center[0] - sprite_radius, center[1] - sprite_radius, special_flags)
+
+    def rect(self, rect, color, special_flags = 0):
+        key = (rect.size, color)
+        sprite = self.rect_sprites.get(key)
+        if sprite is None:
+            sprite = self.rect_sprites[key] = pygame.Surface(rect.size)
+            sprite.fill(color)
+        self.add(sprite, rect.x, rect.y, special_flags)
+
+    def flush(self, target):
+        for special_flags in sorted(self.commands):
+            target.blits(self.commands[special_flags], doreturn = False)
+        self.commands.clear()
+        self.culled = 0
+
+class Particle_system:
+    """Every particle of a level in parallel field lists, updated a whole field at a time and compacted with a mask when some die"""
+    def __init__(self, seed = None) -> None:
+        self.random = random.Random(seed)
+        # Most particles alive at once, the field lists never need to hold more
+        self.high_water = 0
+        self.clear()
+
+    def __len__(self):
+        return len(self.x)
+
+    def clear(self):
+        # Plain lists of floats, array("d") is slower here since every element gets boxed again on each pass
+        self.x = []
+        self.y = []
+        # Positions before the last update, frames between two steps are drawn part way from them
+        self.previous_x = []
+        self.previous_y = []
+        self.vx = []
+        self.vy = []
+        self.radius = []
+        self.shrink = []
+        self.gravity = []
+        self.kind = []
+
+    def emit(self, x, y, vx, vy, radius, shrink, gravity = 0, kind = DEATH_PARTICLE):
+        self.x.append(x)
+        self.y.append(y)
+        self.previous_x.append(x)
+        self.previous_y.append(y)
+        self.vx.append(vx)
+        self.vy.append(vy)
+        self.radius.append(radius)
+        self.shrink.append(shrink)
+        self.gravity.append(gravity)
+        self.kind.append(kind)
+        if len(self.x) > self.high_water:
+            self.high_water = len(self.x)
+
+    def death_burst(self, pos, amount = 50):
+        for _ in range(amount):
+            self.emit(pos[0], pos[1], self.random.random() - 0.5, self.random.random() - 2, 5, 0.05, 0.05, DEATH_PARTICLE)
+
+    def ba_burst(self, pos, speed, amount = 36):
+        for i in range(amount):
+            angle = i * (2 * math.pi / amount)
+            self.emit(pos[0], pos[1], self.random.random() * speed * math.cos(angle), self.random.random() * speed * math.sin(angle), 4, 0.1, 0, BA_PARTICLE)
 
     def update(self):
-        self.pos.x += self.velocity.x
-        self.pos.y += self.velocity.y
-        self.radius -= 0.1
+        if not self.x:
+            return
+        # map over whole fields runs the arithmetic in C instead of one python step per particle
+        self.vy = list(map(add, self.vy, self.gravity))
+        # The updates build new lists, so the old ones become the previous positions without a copy
+        self.previous_x = self.x
+        self.previous_y = self.y
+        self.x = list(map(add, self.x, self.vx))
+        self.y = list(map(add, self.y, self.vy))
+        self.radius = list(map(sub, self.radius, self.shrink))
+        if min(self.radius) <= 0:
+            alive = [radius > 0 for radius in self.radius]
+            for name in PARTICLE_FIELDS:
+                setattr(self, name, list(compress(getattr(self, name), alive)))
 
-    def render(self): 
-            pygame.draw.circle(self.level.surface, "white", (self.pos[0] - self.level.scroll[0], self.pos[1] - self.level.scroll[1]), self.radius)
-            self.level.surface.blit(circle_surf(self.radius * 1.4 , (50,50,50)),(self.pos[0]- self.level.scroll[0]-self.radius * 1.4 , self.pos[1]- self.level.scroll[1]-self.radius * 1.4), special_flags = pygame.BLEND_RGB_ADD)
+    def render(self, batch, scroll, alpha = 1):
+        """Queues a core and an additive glow sprite per particle on the render batch, alpha of the way from the previous update"""
+        view_width, view_height = batch.view_size
+        for x, y, previous_x, previous_y, radius, kind in zip(self.x, self.y, self.previous_x, self.previous_y, self.radius, self.kind):
+            if alpha < 1:
+                x = previous_x + (x - previous_x) * alpha
+                y = previous_y + (y - previous_y) * alpha
+            x -= scroll[0]
+            y -= scroll[1]
+            glow_radius = radius * GLOW_SCALE
+            # Culled before the sprite lookup so offscreen particles only cost this test
+            if x + glow_radius <= 0 or y + glow_radius <= 0 or x - glow_radius >= view_width or y - glow_radius >= view_height:
+                batch.culled += 2
+                continue
+            batch.circle((x, y), radius, PARTICLE_COLORS[kind])
+            batch.circle((x, y), glow_radius, GLOW_COLOR, pygame.BLEND_RGB_ADD)
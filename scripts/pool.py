@@ -0,0 +1,32 @@
+class Pool:
+    """Reusable objects of one class, acquire hands back a released object reset with the new arguments before making a new one"""
+    def __init__(self, cls) -> None:
+        self.cls = cls
+        self.free = []
+        self.active = 0
+        self.created = 0
+        self.high_water = 0
+
+    def acquire(self, *args):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args)
+        else:
+            obj = self.cls(*args)
+            self.created += 1
+        obj.pool = self
+        self.active += 1
+        if self.active > self.high_water:
+            self.high_water = self.active
+        return obj
+
+    def release(self, obj):
+        # A second release would hand the same object out twice
+        if obj.pool is not self:
+            raise ValueError(f"{type(obj).__name__} released to a pool it isn't active in")
+        obj.pool = None
+        self.active -= 1
+        self.free.append(obj)
+
+    def stats(self):
+        return {"active": self.active, "free": len(self.free), "created": self.created, "high_water": self.high_water}
@@ -0,0 +1,177 @@
+import pygame, os, csv, json, time
+from collections import deque
+
+PROFILER_HISTORY = 240 # frames behind the overlay graph and percentiles
+PROFILER_EXPORT_FRAMES = 36000 # frames kept for export, ten minutes at 60 fps
+PROFILE_EXPORT_PATH = "profiles"
+OVERLAY_GRAPH_HEIGHT = 60
+OVERLAY_GRAPH_MS = 33.3 # frame time at the top of the graph
+OVERLAY_TEXT_INTERVAL = 15 # frames between redraws of the overlay text
+PROFILER_TOGGLE_KEY = pygame.K_F3
+PROFILER_EXPORT_KEY = pygame.K_F4
+
+class Null_scope:
+    """What Profiler.scope hands out while profiling is off, timing nothing"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+NULL_SCOPE = Null_scope()
+
+class Timing_scope:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name) -> None:
+        self.profiler = profiler
+        self.name = name
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+        return False
+
+def percentile(ordered, fraction):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] if ordered else 0
+
+class Profiler:
+    """Named timing scopes summed over each frame, a rolling history for the overlay and every frame kept for export"""
+    def __init__(self, history = PROFILER_HISTORY, export_frames = PROFILER_EXPORT_FRAMES) -> None:
+        self.enabled = False
+        self.history_size = history
+        self.scopes = {}
+        # Milliseconds of each scope in the current frame
+        self.current = {}
+        # name -> deque of milliseconds per frame, "frame" being the whole frame
+        self.history = {"frame": deque(maxlen = history)}
+        # (frame milliseconds, {name: milliseconds}) per frame for export
+        self.frames = deque(maxlen = export_frames)
+        self.frame_start = None
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.current.clear()
+        self.frame_start = None
+
+    def scope(self, name):
+        """with profiler.scope("render/tiles"): times the block into that scope of the current frame"""
+        if not self.enabled:
+            return NULL_SCOPE
+        scope = self.scopes.get(name)
+        if scope is None:
+            scope = self.scopes[name] = Timing_scope(self, name)
+            self.history[name] = deque(maxlen = self.history_size)
+        return scope
+
+    def add(self, name, seconds):
+        self.current[name] = self.current.get(name, 0) + seconds * 1000
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        if self.frame_start is not None:
+            frame_ms = (now - self.frame_start) * 1000
+            self.history["frame"].append(frame_ms)
+            for name in self.scopes:
+                self.history[name].append(self.current.get(name, 0))
+            self.frames.append((frame_ms, dict(self.current)))
+        self.current.clear()
+        self.frame_start = now
+
+    def percentiles(self, name):
+        """p50, p95 and p99 of name over the rolling history, in milliseconds"""
+        ordered = sorted(self.history[name])
+        return percentile(ordered, 0.5), percentile(ordered, 0.95), percentile(ordered, 0.99)
+
+    def summary(self):
+        summary = {}
+        for name in ["frame"] + sorted(self.scopes):
+            if name == "frame":
+                values = sorted(frame_ms for frame_ms, times in self.frames)
+            else:
+                values = sorted(times.get(name, 0) for frame_ms, times in self.frames)
+            summary[name] = {"mean": sum(values) / len(values) if values else 0, "p50": percentile(values, 0.5),
+                             "p95": percentile(values, 0.95), "p99": percentile(values, 0.99), "max": values[-1] if values else 0}
+        return summary
+
+    def export(self, path):
+        """Writes the kept frames to path, as CSV (one row per frame, one column per scope) or as JSON with a summary"""
+        names = sorted(self.scopes)
+        if path.endswith(".csv"):
+            with open(path, "w", newline = "") as file:
+                writer = csv.writer(file)
+                writer.writerow(["frame", "frame_ms"] + names)
+                for index, (frame_ms, times) in enumerate(self.frames):
+                    writer.writerow([index, round(frame_ms, 4)] + [round(times.get(name, 0), 4) for name in names])
+        else:
+            data = {"scopes": names, "summary": self.summary(),
+                    "frames": [{"frame_ms": round(frame_ms, 4), **{name: round(value, 4) for name, value in times.items()}} for frame_ms, times in self.frames]}
+            with open(path, "w") as file:
+                json.dump(data, file, indent = 1)
+
+    def export_files(self, directory = PROFILE_EXPORT_PATH):
+        """Exports both formats into directory with a timestamped name, returns their paths"""
+        os.makedirs(directory, exist_ok = True)
+        base = os.path.join(directory, time.strftime("profile_%Y%m%d_%H%M%S"))
+        paths = [base + ".csv", base + ".json"]
+        for path in paths:
+            self.export(path)
+        return paths
+
+class Profiler_overlay:
+    """Rolling frame time graph with the p50/p95/p99 of the frame and every scope, the text is redrawn every few frames"""
+    def __init__(self, profiler) -> None:
+        self.profiler = profiler
+        self.font = pygame.font.SysFont('Courier New', 14)
+        self.graph = pygame.Surface((profiler.history_size, OVERLAY_GRAPH_HEIGHT))
+        self.graph.set_alpha(200)
+        self.text_surfaces = []
+        self.frames_until_text = 0
+
+    def update_text(self):
+        self.text_surfaces = []
+        for name in ["frame"] + sorted(self.profiler.scopes):
+            p50, p95, p99 = self.profiler.percentiles(name)
+            self.text_surfaces.append(self.font.render(f"{name:<20} p50 {p50:6.2f}  p95 {p95:6.2f}  p99 {p99:6.2f} ms", True, "white", (0, 0, 0)))
+
+    def render(self, target, pos = (10, 70)):
+        if not self.profiler.enabled:
+            return
+        if self.frames_until_text <= 0:
+            self.update_text()
+            self.frames_until_text = OVERLAY_TEXT_INTERVAL
+        self.frames_until_text -= 1
+
+        self.graph.fill((0, 0, 0))
+        scale = OVERLAY_GRAPH_HEIGHT / OVERLAY_GRAPH_MS
+        # 60 fps budget line
+        budget_y = OVERLAY_GRAPH_HEIGHT - 1000 / 60 * scale
+        pygame.draw.line(self.graph, (80, 80, 80), (0, budget_y), (self.graph.get_width(), budget_y))
+        for x, frame_ms in enumerate(self.profiler.history["frame"]):
+            color = (0, 200, 0) if frame_ms <= 1000 / 60 else (230, 60, 40)
+            pygame.draw.line(self.graph, color, (x, OVERLAY_GRAPH_HEIGHT), (x, OVERLAY_GRAPH_HEIGHT - min(frame_ms * scale, OVERLAY_GRAPH_HEIGHT)))
+        target.blit(self.graph, pos)
+
+        y = pos[1] + OVERLAY_GRAPH_HEIGHT + 4
+        for text in self.text_surfaces:
+            target.blit(text, (pos[0], y))
+            y += text.get_height()
+
+def handle_profiler_key(game, key):
+    """F3 toggles profiling and its overlay, F4 exports the recorded frames, returns whether key was one of them"""
+    if key == PROFILER_TOGGLE_KEY:
+        game.profiler.toggle()
+        return True
+    if key == PROFILER_EXPORT_KEY:
+        if game.profiler.frames:
+            print("profile exported to " + ", ".join(game.profiler.export_files()))
+        return True
+    return False
@@ -2,43 +2,66 @@ import pygame, math
 from scripts.particles import *
 
 class projectile:
+    __slots__ = ("game", "level", "pos", "previous_pos", "velocity", "player", "radius", "rect", "pool")
+
     def __init__(self, player, game, level, pos) -> None:
         self.game = game
         self.level = level
-        self.pos = pygame.math.Vector2(pos[0], pos[1])
-        self.velocity = pygame.math.Vector2(0, 0)
-        self.player = player
+        self.pos = pygame.math.Vector2()
+        self.previous_pos = pygame.math.Vector2()
+        self.velocity = pygame.math.Vector2()
         self.radius = 5
-        self.rect = pygame.rect.Rect(self.pos.x - self.radius,self.pos.x - self.radius, self.radius * 2, self.radius * 2)
+        self.rect = pygame.rect.Rect(0, 0, self.radius * 2, self.radius * 2)
+        self.pool = None
+        self.reset(player, game, level, pos)
+
+    def reset(self, player, game, level, pos):
+        """Reinitialises a pooled projectile in place, the vectors and rect are reused"""
+        self.game = game
+        self.level = level
+        self.player = player
+        self.pos.update(pos[0], pos[1])
+        self.previous_pos.update(pos[0], pos[1])
+        self.velocity.update(0, 0)
+        self.rect.x = self.pos.x - self.radius
+        self.rect.y = self.pos.x - self.radius
 
     def update(self):
+        self.previous_pos.update(self.pos)
         self.pos += self.velocity
 
         self.rect.x = self.pos.x - self.radius
         self.rect.y = self.pos.y - self.radius
 
 
+    def render_pos(self):
+        """Position alpha of the way from the previous step, where frames between two steps draw it"""
+        if self.level.render_alpha < 1:
+            return self.previous_pos.lerp(self.pos, self.level.render_alpha)
+        return self.pos
+
     def render(self):
-        pygame.draw.rect(self.level.surface, "blue", self.rect.move(-self.level.scroll.x, - self.level.scroll.y))
+        pos = self.render_pos()
+        self.level.render_batch.rect(self.rect.move(round(pos.x - self.pos.x - self.level.render_scroll.x), round(pos.y - self.pos.y - self.level.render_scroll.y)), "blue")
         # pygame.draw.circle(self.level.surface, "white", (self.pos.x - self.level.scroll.x, self.pos.y - self.level.scroll.y), self.radius)
 
     
 class Ba_projectile(projectile):
-    def __init__(self, player, game, level, pos) -> None:
-        super().__init__(player, game, level, pos)
+    __slots__ = ()
+
+    def reset(self, player, game, level, pos):
+        super().reset(player, game, level, pos)
         speed = 3
         strength = ((self.pos[0]- self.player.rect.centerx)**2 + (self.pos[1]- self.player.rect.centery)**2) ** 0.5 
-        self.velocity = pygame.math.Vector2(speed * (self.player.rect.centerx- self.pos[0])/strength, speed * (self.player.rect.centery- self.pos[1])/strength)
+        self.velocity.update(speed * (self.player.rect.centerx- self.pos[0])/strength, speed * (self.player.rect.centery- self.pos[1])/strength)
 
     def update(self):
         super().update()
         if self.level.tilemap.solid_check(self.pos):
-            self.level.enemy_projectiles.remove(self)
-            for i in range(36):
-                angle = i * (2 * math.pi / 36)
-                speed = 1.5
-                self.level.particle_list.append(Ba_Particle(self.game, self.level, self.pos, pygame.math.Vector2(random.random() * speed * math.cos(angle), random.random() * speed * math.sin(angle))))
+            self.level.particles.ba_burst(self.pos, 1.5)
+            self.level.remove_projectile(self)
 
 
     def render(self):
-        pygame.draw.circle(self.level.surface, "white", (self.pos.x - self.level.scroll.x, self.pos.y - self.level.scroll.y), self.radius)
+        pos = self.render_pos()
+        self.level.render_batch.circle((pos.x - self.level.render_scroll.x, pos.y - self.level.render_scroll.y), self.radius, "white")
@@ -0,0 +1,70 @@
+import pygame, math
+from collections import OrderedDict
+from scripts.tile_grid import *
+
+RENDER_CACHE_BUDGET = 32 * 1024 * 1024  # bytes of baked chunk surfaces kept alive
+
+class Chunk_render_cache:
+    """World space surfaces of CHUNK_SIZE x CHUNK_SIZE tiles, baked on first use and evicted least recently used first"""
+    def __init__(self, game, budget = RENDER_CACHE_BUDGET) -> None:
+        self.game = game
+        self.chunk_pixels = CHUNK_SIZE * game.tile_size
+        self.budget = budget
+        self.surfaces = OrderedDict()
+        self.used_bytes = 0
+
+    def chunk_has_content(self, key):
+        return True
+
+    def bake_chunk(self, key, surface):
+        pass
+
+    def new_chunk_surface(self):
+        surface = pygame.Surface((self.chunk_pixels, self.chunk_pixels))
+        surface.set_colorkey((0,0,0))
+        return surface
+
+    def get_chunk(self, key):
+        surface = self.surfaces.get(key)
+        if surface is not None:
+            self.surfaces.move_to_end(key)
+            return surface
+        surface = self.new_chunk_surface()
+        self.bake_chunk(key, surface)
+        self.surfaces[key] = surface
+        self.used_bytes += surface.get_bytesize() * self.chunk_pixels * self.chunk_pixels
+        # The newest chunk always stays, even when a single chunk is over the budget
+        while self.used_bytes > self.budget and len(self.surfaces) > 1:
+            self.drop(next(iter(self.surfaces)))
+        return surface
+
+    def drop(self, key):
+        surface = self.surfaces.pop(key, None)
+        if surface is not None:
+            self.used_bytes -= surface.get_bytesize() * self.chunk_pixels * self.chunk_pixels
+
+    def invalidate_cell(self, x, y):
+        self.drop((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+
+    def clear(self):
+        self.surfaces.clear()
+        self.used_bytes = 0
+
+    def visible_chunks(self, scroll, view_size):
+        left = math.floor(scroll[0]) // self.chunk_pixels
+        top = math.floor(scroll[1]) // self.chunk_pixels
+        right = (math.floor(scroll[0]) + view_size[0] - 1) // self.chunk_pixels
+        bottom = (math.floor(scroll[1]) + view_size[1] - 1) // self.chunk_pixels
+        for chunk_x in range(left, right + 1):
+            for chunk_y in range(top, bottom + 1):
+                if self.chunk_has_content((chunk_x, chunk_y)):
+                    yield chunk_x, chunk_y
+
+    def render(self, target, scroll, view_size = None):
+        """Blits the chunks intersecting the view rect starting at scroll, view_size defaults to the target size"""
+        if view_size is None:
+            view_size = target.get_size()
+        # Every chunk uses the same whole pixel scroll so neighbouring chunks never leave seams
+        scroll_x, scroll_y = math.floor(scroll[0]), math.floor(scroll[1])
+        for key in self.visible_chunks(scroll, view_size):
+            target.blit(self.get_chunk(key), (key[0] * self.chunk_pixels - scroll_x, key[1] * self.chunk_pixels - scroll_y))
@@ -0,0 +1,149 @@
+import sys, json, time, random
+from concurrent.futures import ProcessPoolExecutor
+from scripts.level import *
+
+RECORDING_VERSION = 1
+
+def encode_inputs(inputs):
+    """Run length encodes per step INPUT_ bits as [[bits, steps], ...], held keys make long runs"""
+    runs = []
+    for bits in inputs:
+        if runs and runs[-1][0] == bits:
+            runs[-1][1] += 1
+        else:
+            runs.append([bits, 1])
+    return runs
+
+def decode_inputs(runs):
+    inputs = bytearray()
+    for bits, steps in runs:
+        inputs.extend(bytes([bits]) * steps)
+    return inputs
+
+def scripted_inputs(seed, steps):
+    """Reproducible stand in for a player: runs one way for a while, mostly right, jumping now and then and restarting when dead"""
+    rng = random.Random(seed)
+    inputs = bytearray()
+    while len(inputs) < steps:
+        direction = INPUT_RIGHT if rng.random() < 0.75 else INPUT_LEFT
+        for _ in range(rng.randint(30, 150)):
+            inputs.append(direction)
+        # A few jumps of random height along the run
+        for _ in range(rng.randint(0, 3)):
+            jump = rng.randrange(len(inputs) - 20, len(inputs))
+            inputs[jump] |= INPUT_JUMP
+            release = jump + rng.randint(5, 20)
+            if release < len(inputs):
+                inputs[release] |= INPUT_JUMP_RELEASE
+        inputs[-1] |= INPUT_RESTART
+    return inputs[:steps]
+
+def level_state(level):
+    """Player and mob state compared at the end of a replay, json friendly so it can be stored with the recording"""
+    player = level.player
+    mobs = sorted([type(enemy).__name__, round(enemy.pos.x, 3), round(enemy.pos.y, 3), enemy.health, enemy.dying] for enemy in level.enemy_list)
+    return {"player": [round(player.pos.x, 3), round(player.pos.y, 3), player.health], "game_end_state": level.game_end_state,
+            "mobs": mobs, "particles": len(level.particles)}
+
+class Input_recording:
+    """Every step's INPUT_ bits of a play session plus what is needed to play it again: level, streaming mode and particle seed"""
+    def __init__(self, level_name, seed, inputs = None, streaming = False, final_state = None) -> None:
+        self.level_name = level_name
+        self.seed = seed
+        self.inputs = inputs if inputs is not None else bytearray()
+        self.streaming = streaming
+        # level_state at the end of the recording, None until it was recorded
+        self.final_state = final_state
+
+    @classmethod
+    def start(cls, level):
+        """Starts recording the steps of level, which needs a seed to be replayable"""
+        recording = cls(level.level_name, level.seed, streaming = level.tilemap.streaming)
+        level.recorded_inputs = recording.inputs
+        return recording
+
+    def finish(self, level):
+        level.recorded_inputs = None
+        self.final_state = level_state(level)
+
+    def save(self, path):
+        data = {"version": RECORDING_VERSION, "level": self.level_name, "seed": self.seed, "streaming": self.streaming,
+                "steps": len(self.inputs), "inputs": encode_inputs(self.inputs), "final_state": self.final_state}
+        with open(path, "w") as file:
+            json.dump(data, file)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            data = json.load(file)
+        if data["version"] != RECORDING_VERSION:
+            raise ValueError(f"{path}: unsupported recording version {data['version']}")
+        return cls(data["level"], data["seed"], decode_inputs(data["inputs"]), data["streaming"], data["final_state"])
+
+def replay(game, recording, render = False):
+    """Plays recording back as fast as possible, returns the final level_state, the time of every step and the level's pool_stats"""
+    level = Level(game, recording.level_name, recording.streaming, recording.seed)
+    step_times = []
+    for inputs in recording.inputs:
+        start = time.perf_counter()
+        level.step(inputs)
+        if render:
+            level.render()
+        step_times.append(time.perf_counter() - start)
+    # Through json like the stored state, so tuples and lists compare equal
+    return json.loads(json.dumps(level_state(level))), step_times, level.pool_stats()
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+worker_game = None
+
+def replay_job(path, render = False):
+    """Runs in a batch worker process, each one makes its own headless Game on its first job"""
+    global worker_game
+    if worker_game is None:
+        # game.py sits at the repository root next to scripts/
+        from game import Game
+        worker_game = Game(headless = True)
+    recording = Input_recording.load(path)
+    start = time.perf_counter()
+    state, step_times, pools = replay(worker_game, recording, render)
+    elapsed = time.perf_counter() - start
+    return {"recording": path, "level": recording.level_name, "steps": len(step_times),
+            "steps_per_second": len(step_times) / elapsed if elapsed else 0, "p99_ms": percentile(step_times, 0.99) * 1000 if step_times else 0,
+            "state": state, "pools": pools, "matches": None if recording.final_state is None else state == recording.final_state}
+
+def run_batch(paths, workers = None, render = False):
+    """Replays the recordings at paths across a process pool, the results come back in the order of paths"""
+    with ProcessPoolExecutor(workers) as executor:
+        return list(executor.map(replay_job, paths, [render] * len(paths)))
+
+
+if __name__ == "__main__":
+    # python -m scripts.replay [--workers n] [--render] [--update] recording ...
+    # Replays recordings headless in parallel and checks they end in their recorded state, --update stores the new state instead
+    args = sys.argv[1:]
+    render = "--render" in args
+    update = "--update" in args
+    args = [arg for arg in args if arg not in ("--render", "--update")]
+    workers = None
+    if "--workers" in args:
+        index = args.index("--workers")
+        workers = int(args[index + 1])
+        del args[index:index + 2]
+    if not args:
+        print("usage: python -m scripts.replay [--workers n] [--render] [--update] recording ...")
+        sys.exit(1)
+    failed = False
+    for result in run_batch(args, workers, render):
+        if update:
+            recording = Input_recording.load(result["recording"])
+            recording.final_state = result["state"]
+            recording.save(result["recording"])
+            status = "updated"
+        else:
+            status = {True: "ok", False: "MISMATCH", None: "no recorded state"}[result["matches"]]
+            failed |= result["matches"] is False
+        print(f"{result['recording']}: {result['steps']} steps, {result['steps_per_second']:.0f} steps/s, p99 {result['p99_ms']:.2f} ms, {status}")
+    sys.exit(1 if failed else 0)
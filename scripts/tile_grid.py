@@ -0,0 +1,164 @@
+from array import array
+
+CHUNK_SIZE = 16
+CHUNK_SHIFT = 4
+CHUNK_MASK = CHUNK_SIZE - 1
+CHUNK_AREA = CHUNK_SIZE * CHUNK_SIZE
+
+# String table shared by every grid, element id 0 is reserved for an empty cell
+ELEMENT_NAMES = [(None, None)]
+ELEMENT_IDS = {}
+
+def element_id(world_element_type, element):
+    key = (world_element_type, element)
+    if key not in ELEMENT_IDS:
+        ELEMENT_IDS[key] = len(ELEMENT_NAMES)
+        ELEMENT_NAMES.append(key)
+    return ELEMENT_IDS[key]
+
+def element_name(element_id):
+    """Returns the (world_element_type, element) pair of an element id"""
+    return ELEMENT_NAMES[element_id]
+
+def chunk_key(x, y):
+    return (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+
+def local_index(x, y):
+    return ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+
+
+class Tile_chunk:
+    def __init__(self) -> None:
+        self.elements = array("H", bytes(CHUNK_AREA * 2))
+        self.variances = array("B", bytes(CHUNK_AREA))
+        # Local indices of the non empty cells, so iteration never scans the empty ones
+        self.occupied = set()
+
+    @property
+    def count(self):
+        return len(self.occupied)
+
+
+class Tile_grid:
+    """Sparse tile storage split into CHUNK_SIZE x CHUNK_SIZE chunks of packed integer arrays"""
+    def __init__(self) -> None:
+        self.chunks = {}
+        self.count = 0
+        # Cells whose autotile variance has to be resolved again
+        self.dirty = set()
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, pos):
+        return self.get(pos[0], pos[1]) != 0
+
+    def get(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return 0
+        return chunk.elements[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def get_variance(self, x, y):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is None:
+            return 0
+        return chunk.variances[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)]
+
+    def set(self, x, y, element_id, variance = 0):
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            chunk = self.chunks[key] = Tile_chunk()
+        index = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if chunk.elements[index] == 0:
+            chunk.occupied.add(index)
+            self.count += 1
+        chunk.elements[index] = element_id
+        chunk.variances[index] = variance
+
+    def set_variance(self, x, y, variance):
+        chunk = self.chunks.get((x >> CHUNK_SHIFT, y >> CHUNK_SHIFT))
+        if chunk is not None:
+            chunk.variances[((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)] = variance
+
+    def remove(self, x, y):
+        key = (x >> CHUNK_SHIFT, y >> CHUNK_SHIFT)
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return False
+        index = ((y & CHUNK_MASK) << CHUNK_SHIFT) | (x & CHUNK_MASK)
+        if chunk.elements[index] == 0:
+            return False
+        chunk.elements[index] = 0
+        chunk.variances[index] = 0
+        chunk.occupied.discard(index)
+        self.count -= 1
+        # Empty chunks are dropped so iteration only ever visits chunks holding tiles
+        if not chunk.occupied:
+            del self.chunks[key]
+        return True
+
+    def add_chunk(self, key, chunk):
+        self.drop_chunk(key)
+        self.chunks[key] = chunk
+        self.count += chunk.count
+
+    def drop_chunk(self, key):
+        chunk = self.chunks.pop(key, None)
+        if chunk is not None:
+            self.count -= chunk.count
+
+    def chunk_tiles(self, key):
+        """Yields (x, y, element_id, variance) for every tile stored in one chunk"""
+        chunk = self.chunks.get(key)
+        if chunk is None:
+            return
+        origin_x = key[0] << CHUNK_SHIFT
+        origin_y = key[1] << CHUNK_SHIFT
+        elements = chunk.elements
+        variances = chunk.variances
+        # Sorted so the cells still come out row by row like a full scan of the chunk
+        for index in sorted(chunk.occupied):
+            yield origin_x + (index & CHUNK_MASK), origin_y + (index >> CHUNK_SHIFT), elements[index], variances[index]
+
+    def tiles(self):
+        for key in list(self.chunks):
+            yield from self.chunk_tiles(key)
+
+    def tiles_in_rect(self, left, top, right, bottom):
+        """Yields the tiles with left <= x < right and top <= y < bottom"""
+        if right <= left or bottom <= top:
+            return
+        first_x, first_y = left >> CHUNK_SHIFT, top >> CHUNK_SHIFT
+        end_x, end_y = ((right - 1) >> CHUNK_SHIFT) + 1, ((bottom - 1) >> CHUNK_SHIFT) + 1
+        # Small rects look their chunks up directly, big ones walk the stored chunks instead of the empty space
+        if (end_x - first_x) * (end_y - first_y) < len(self.chunks):
+            keys = [(chunk_x, chunk_y) for chunk_x in range(first_x, end_x) for chunk_y in range(first_y, end_y) if (chunk_x, chunk_y) in self.chunks]
+        else:
+            keys = list(self.chunks)
+        for key in keys:
+            chunk_left = key[0] << CHUNK_SHIFT
+            chunk_top = key[1] << CHUNK_SHIFT
+            if chunk_left >= right or chunk_left + CHUNK_SIZE <= left or chunk_top >= bottom or chunk_top + CHUNK_SIZE <= top:
+                continue
+            if left <= chunk_left and chunk_left + CHUNK_SIZE <= right and top <= chunk_top and chunk_top + CHUNK_SIZE <= bottom:
+                yield from self.chunk_tiles(key)
+                continue
+            for x, y, element, variance in self.chunk_tiles(key):
+                if left <= x < right and top <= y < bottom:
+                    yield x, y, element, variance
+
+    def to_json(self):
+        grid = {}
+        for x, y, element, variance in self.tiles():
+            world_element_type, name = ELEMENT_NAMES[element]
+            grid[str(x) + ";" + str(y)] = {"world_element_type": world_element_type, "element": name, "variance": variance, "pos": [x, y]}
+        return grid
+
+    @classmethod
+    def from_json(cls, grid_dict):
+        grid = cls()
+        for tile in grid_dict.values():
+            grid.set(tile["pos"][0], tile["pos"][1], element_id(tile["world_element_type"], tile["element"]), tile["variance"])
+        return grid
@@ -1,40 +1,113 @@
 import pygame, json
 from scripts.utils import *
+from scripts.tile_grid import *
+from scripts.collision import *
+from scripts.level_format import *
 
 FIX1_TILES = ['dirt', 'castle_stone']
 TILE_AROUND = [(0,-1),(1,-1),(1,0),(1,1),(0,1),(-1,1),(-1,0),(-1,-1), (0,0)]
 TILE_NEIGHBOURS = {(0,-1) : "up",(1,0) : "right",(0,1): "down",(-1,0): "left"}
 PHYSICS_TILES = ['dirt', 'mossy_stone','castle_stone', 'kill_tile', "victory_tile"]
 
+# Neighbour bits of the autotile mask
+UP, RIGHT, DOWN, LEFT = 1, 2, 4, 8
+LEFT_UP, RIGHT_UP, LEFT_DOWN, RIGHT_DOWN = 16, 32, 64, 128
+AUTOTILE_NEIGHBOURS = [((0,-1), UP), ((1,0), RIGHT), ((0,1), DOWN), ((-1,0), LEFT), ((-1,-1), LEFT_UP), ((1,-1), RIGHT_UP), ((-1,1), LEFT_DOWN), ((1,1), RIGHT_DOWN)]
+
+def autotile_variance(mask):
+    """Variance of a FIX1_TILES tile from its neighbour mask, None keeps the current variance"""
+    up, right, down, left = mask & UP, mask & RIGHT, mask & DOWN, mask & LEFT
+    if right and not left and not up and down:
+        return 0
+    elif right and left and not up and down:
+        return 1
+    elif not right and left and not up and down:
+        return 2
+    elif right and not left and up and down:
+        return 3
+    elif right and left and up and down:
+        corners = mask & (LEFT_UP | RIGHT_UP | LEFT_DOWN | RIGHT_DOWN)
+        if corners == LEFT_UP | LEFT_DOWN | RIGHT_DOWN:
+            return 9
+        elif corners == RIGHT_UP | LEFT_DOWN | RIGHT_DOWN:
+            return 10
+        elif corners == LEFT_UP | RIGHT_UP | LEFT_DOWN:
+            return 11
+        elif corners == LEFT_UP | RIGHT_UP | RIGHT_DOWN:
+            return 12
+        return 4
+    elif not right and left and up and down:
+        return 5
+    elif right and not left and up and not down:
+        return 6
+    elif right and left and up and not down:
+        return 7
+    elif not right and left and up and not down:
+        return 8
+    return None
+
+AUTOTILE_VARIANCES = [autotile_variance(mask) for mask in range(256)]
+
 class Tilemap:
-    def __init__(self, game, name) -> None:
+    def __init__(self, game, name, streaming = False, path = None) -> None:
         self.game = game
         self.name = name
+        # Levels live in levels/ unless an explicit file path is given
+        self.path = path if path is not None else "levels/" + name
+        # Streaming only works on binary levels, json levels are always loaded whole
+        self.streaming = streaming
+        self.loaded_chunks = set()
         self.layer_list,self.background_list,self.borders = self.load()
+        self.collision_index = Collision_index()
+        self.collision_index.build(self.layer_list)
+        self.static_geometry = Static_geometry(self.collision_index, self.game.tile_size)
         # self.layer_list = []
         # self.layer_list.append({"collision": True, "visible": True, "off_grid" : {}, "grid": {}}) #, "surface": transparent_surface(self.game.display.get_size())})
-        self.layer_surfaces = [transparent_surface(self.game.display.get_size()) for _ in self.layer_list]
         self.layer_index = 0
 
         # self.background_list = []
         self.background_index = 0
 
-        self.surface =  transparent_surface((self.game.display.get_size()))
-
         # self.borders = {"top":0, "bottom": 0, "left": 0, "right": 0}
 
     def add_element_tile(self, element, pos, layer_index = 0):
-        loc = str(pos[0]) + ";" + str(pos[1])
-        self.layer_list[layer_index]["grid"][loc] = {"world_element_type": element.world_element_type, "element": element.element, "variance":0, "pos": pos}
+        grid = self.layer_list[layer_index]["grid"]
+        replaced = grid.get(pos[0], pos[1])
+        grid.set(pos[0], pos[1], element_id(element.world_element_type, element.element))
+        self.mark_dirty(pos, layer_index)
+        self.collision_index.update_cell(pos[0], pos[1], self.layer_list)
+        self.static_geometry.invalidate_cell(pos[0], pos[1])
+        if element.element == "player_spawner":
+            self.player_spawn = tuple(pos)
+        elif replaced and element_name(replaced)[1] == "player_spawner":
+            self.spawner_removed(pos)
 
     def add_offgrid_element(self, element, pos, layer_index = 0):
         loc = str(int(pos[0])) + ";" + str(int(pos[1]))
         self.layer_list[layer_index]["off_grid"][loc] = {"world_element_type": element.world_element_type, "element": element.element, "variance":0, "pos": pos}
 
     def delete_element_tile(self, pos, layer_index = 0):
-        loc = str(pos[0]) + ";" + str(pos[1])
-        if loc in self.layer_list[layer_index]["grid"]:
-            del self.layer_list[layer_index]["grid"][loc]
+        grid = self.layer_list[layer_index]["grid"]
+        removed = grid.get(pos[0], pos[1])
+        if grid.remove(pos[0], pos[1]):
+            self.mark_dirty(pos, layer_index)
+            self.collision_index.update_cell(pos[0], pos[1], self.layer_list)
+            self.static_geometry.invalidate_cell(pos[0], pos[1])
+            if element_name(removed)[1] == "player_spawner":
+                self.spawner_removed(pos)
+
+    def spawner_removed(self, pos):
+        # Falls back to another spawner of the level so the saved spawn always points at one
+        if self.player_spawn == tuple(pos):
+            self.player_spawn = self.find_player_spawn()
+
+    def find_player_spawn(self):
+        """Position of the first player_spawner in the loaded grids, None when there is none"""
+        for layer in self.layer_list:
+            for x, y, element, variance in layer["grid"].tiles():
+                if element_name(element)[1] == "player_spawner":
+                    return (x, y)
+        return None
 
     def delete_offgrid_element(self, pos, scroll, layer_index = 0):
         for tile in self.layer_list[layer_index]["off_grid"].copy().values():
@@ -43,12 +116,17 @@ class Tilemap:
             if self.game.static_assets[tile["world_element_type"] + "/" + tile["element"]][tile["variance"]].get_rect(topleft = offset_pos).collidepoint(pos):
                 del self.layer_list[layer_index]["off_grid"][loc]
     def add_layer(self, layer_index):
-        self.layer_list.insert(layer_index + 1, {"collision": True, "visible": True, "off_grid" : {}, "grid": {}}) #, "surface": transparent_surface(self.game.display.get_size())})
-        self.layer_surfaces.insert(layer_index + 1, transparent_surface(self.game.display.get_size()))
+        self.layer_list.insert(layer_index + 1, {"collision": True, "visible": True, "off_grid" : {}, "grid": Tile_grid()}) #, "surface": transparent_surface(self.game.display.get_size())})
     def delete_layer(self, layer_index):
         if layer_index != 0:
             del self.layer_list[layer_index]
-            del self.layer_surfaces[layer_index]
+            self.collision_index.build(self.layer_list)
+            self.static_geometry.invalidate_all()
+
+    def toggle_collision(self, layer_index):
+        self.layer_list[layer_index]["collision"] = not self.layer_list[layer_index]["collision"]
+        self.collision_index.build(self.layer_list)
+        self.static_geometry.invalidate_all()
 
     def update_border(self, border_rect):
         self.borders["top"] = int(border_rect.top // self.game.tile_size)
@@ -56,123 +134,101 @@ class Tilemap:
         self.borders["left"] = int(border_rect.left // self.game.tile_size)
         self.borders["right"] = int(border_rect.right // self.game.tile_size)
 
-    def tiles_around(self, pos):
-        tiles = []
-        tile_loc = (int(pos[0] // self.game.tile_size), int(pos[1] // self.game.tile_size))
-        for offset in TILE_AROUND:
-            check_loc = str(tile_loc[0] + offset[0]) + ';' + str(tile_loc[1] + offset[1])
-            for layer in self.layer_list:
-                if check_loc in layer["grid"]:
-                    tiles.append({"tile": layer["grid"][check_loc], "collision": layer["collision"]})
-        return tiles
-    
-    def physics_rect_around(self, pos):
-        tiles_att_list = self.tiles_around(pos)
-        rects_with_elements = []
-        for tile_attr in tiles_att_list:
-            tile_pos = tile_attr["tile"]["pos"]
-            if tile_attr["tile"]["element"] in PHYSICS_TILES and tile_attr["collision"]:
-                rect = pygame.rect.Rect(tile_pos[0] * self.game.tile_size, tile_pos[1] * self.game.tile_size, self.game.tile_size, self.game.tile_size)
-                element = tile_attr["tile"]["element"]
-                rects_with_elements.append((rect, element))
-        return rects_with_elements
-    
     def solid_check(self, pos):
-        tile_loc = (str(int(pos[0] // self.game.tile_size))+ ';' + str( int(pos[1] // self.game.tile_size)))
-        # if tile_loc in self.grid:
+        return bool(self.collision_index.get(int(pos[0] // self.game.tile_size), int(pos[1] // self.game.tile_size)) & ANY_PHYSICS)
+
+    def end_tile_check(self, pos):
+        """Returns "death" or "victory" when pos is inside a kill or victory tile"""
+        flags = self.collision_index.get(int(pos[0] // self.game.tile_size), int(pos[1] // self.game.tile_size))
+        if flags & ANY_KILL:
+            return "death"
+        elif flags & ANY_VICTORY:
+            return "victory"
+        return None
+
+    def mark_dirty(self, pos, layer_index = 0):
+        """Queues the cell at pos and its 8 neighbours for the next tile_fix"""
+        dirty = self.layer_list[layer_index]["grid"].dirty
+        for offset in TILE_AROUND:
+            dirty.add((pos[0] + offset[0], pos[1] + offset[1]))
+
+    def mark_all_dirty(self):
         for layer in self.layer_list:
-            if tile_loc in layer["grid"] and layer["grid"][tile_loc]["element"] in PHYSICS_TILES:
-                return True
+            layer["grid"].dirty.update((x, y) for x, y, element, variance in layer["grid"].tiles())
 
     def tile_fix(self, layer_index = 0):
-        for tile in self.layer_list[layer_index]["grid"]:
-            if self.layer_list[layer_index]["grid"][tile]["element"] in FIX1_TILES:
+        """Resolves the autotile variance of the dirty cells of a layer, returns the cells whose variance changed"""
+        grid = self.layer_list[layer_index]["grid"]
+        if not grid.dirty:
+            return []
+        changed = []
+        fix_ids = {element for element in range(1, len(ELEMENT_NAMES)) if ELEMENT_NAMES[element][1] in FIX1_TILES}
+        for x, y in grid.dirty:
+            if grid.get(x, y) in fix_ids:
                 # checking which blocks are next to the tile to calculate its variant
-                tiles_next = {"right": False, "left": False, "up": False, "down": False}
-                for tup in TILE_NEIGHBOURS:
-                    neighbour_tile = str(self.layer_list[layer_index]["grid"][tile]["pos"][0] + tup[0]) + ";" + str(self.layer_list[layer_index]["grid"][tile]["pos"][1] + tup[1])
-                    if neighbour_tile in self.layer_list[layer_index]["grid"] and self.layer_list[layer_index]["grid"][neighbour_tile]["element"] in FIX1_TILES:
-                        tiles_next[TILE_NEIGHBOURS[tup]] = True
-                
-                if tiles_next["right"] and not tiles_next["left"] and not tiles_next["up"] and tiles_next["down"]: 
-                    self.layer_list[layer_index]["grid"][tile]["variance"] = 0
-                elif tiles_next["right"] and tiles_next["left"] and not tiles_next["up"] and tiles_next["down"]:
-                    self.layer_list[layer_index]["grid"][tile]["variance"] = 1
-                elif not tiles_next["right"] and tiles_next["left"] and not tiles_next["up"] and tiles_next["down"]: 
-                    self.layer_list[layer_index]["grid"][tile]["variance"] = 2
-                elif tiles_next["right"] and not tiles_next["left"] and tiles_next["up"] and tiles_next["down"]: 
-                    self.layer_list[layer_index]["grid"][tile]["variance"] = 3
-                elif tiles_next["right"] and tiles_next["left"] and tiles_next["up"] and tiles_next["down"]:
-                    directions_bool = {}
-                    left_up = str(self.layer_list[layer_index]["grid"][tile]["pos"][0] - 1) + ";" + str(self.layer_list[layer_index]["grid"][tile]["pos"][1] - 1)
-                    right_up = str(self.layer_list[layer_index]["grid"][tile]["pos"][0] + 1) + ";" + str(self.layer_list[layer_index]["grid"][tile]["pos"][1] - 1)
-                    left_down = str(self.layer_list[layer_index]["grid"][tile]["pos"][0] - 1) + ";" + str(self.layer_list[layer_index]["grid"][tile]["pos"][1] + 1)
-                    right_down = str(self.layer_list[layer_index]["grid"][tile]["pos"][0] + 1) + ";" + str(self.layer_list[layer_index]["grid"][tile]["pos"][1] + 1)
-                    directions_bool["left_up"] = False
-                    directions_bool["right_up"] = False
-                    directions_bool["left_down"] = False
-                    directions_bool["right_down"] = False
-                    if left_up in self.layer_list[layer_index]["grid"]:
-                        if self.layer_list[layer_index]["grid"][left_up]["element"] in FIX1_TILES:
-                            directions_bool["left_up"] = True
-                    if right_up in self.layer_list[layer_index]["grid"]:
-                        if self.layer_list[layer_index]["grid"][right_up]["element"] in FIX1_TILES:
-                            directions_bool["right_up"] = True
-                    if left_down in self.layer_list[layer_index]["grid"]:
-                        if self.layer_list[layer_index]["grid"][left_down]["element"] in FIX1_TILES:
-                            directions_bool["left_down"] = True
-                    if right_down in self.layer_list[layer_index]["grid"]:
-                        if self.layer_list[layer_index]["grid"][right_down]["element"] in FIX1_TILES:
-                            directions_bool["right_down"] = True
-
-                    if directions_bool["left_up"] and not directions_bool["right_up"] and directions_bool["left_down"] and directions_bool["right_down"]:
-                        self.layer_list[layer_index]["grid"][tile]["variance"] = 9
-                    elif not directions_bool["left_up"] and directions_bool["right_up"] and directions_bool["left_down"] and directions_bool["right_down"]:
-                        self.layer_list[layer_index]["grid"][tile]["variance"] = 10
-                    elif directions_bool["left_up"] and directions_bool["right_up"] and directions_bool["left_down"] and not directions_bool["right_down"]:
-                        self.layer_list[layer_index]["grid"][tile]["variance"] = 11
-                    elif directions_bool["left_up"] and directions_bool["right_up"] and not directions_bool["left_down"] and directions_bool["right_down"]:
-                        self.layer_list[layer_index]["grid"][tile]["variance"] = 12 
-                    else:
-                        self.layer_list[layer_index]["grid"][tile]["variance"] = 4  
-                elif not tiles_next["right"] and tiles_next["left"] and tiles_next["up"] and tiles_next["down"]: 
-                    self.layer_list[layer_index]["grid"][tile]["variance"] = 5
-                elif tiles_next["right"] and not tiles_next["left"] and tiles_next["up"] and  not tiles_next["down"]: 
-                    self.layer_list[layer_index]["grid"][tile]["variance"] = 6
-                elif tiles_next["right"] and ["left"] and tiles_next["up"] and not tiles_next["down"]: 
-                    self.layer_list[layer_index]["grid"][tile]["variance"] = 7
-                elif not tiles_next["right"] and tiles_next["left"] and tiles_next["up"] and not tiles_next["down"]: 
-                    self.layer_list[layer_index]["grid"][tile]["variance"] = 8
+                mask = 0
+                for offset, bit in AUTOTILE_NEIGHBOURS:
+                    if grid.get(x + offset[0], y + offset[1]) in fix_ids:
+                        mask |= bit
+                variance = AUTOTILE_VARIANCES[mask]
+                if variance is not None and variance != grid.get_variance(x, y):
+                    grid.set_variance(x, y, variance)
+                    changed.append((x, y))
+        grid.dirty.clear()
+        return changed
+
+    def stream_around(self, center, radius):
+        """Pages in the chunks within radius of the center chunk and drops the ones further than radius + 1, returns (loaded, dropped) chunk keys"""
+        loaded = []
+        for chunk_x in range(center[0] - radius, center[0] + radius + 1):
+            for chunk_y in range(center[1] - radius, center[1] + radius + 1):
+                key = (chunk_x, chunk_y)
+                if key in self.loaded_chunks:
+                    continue
+                self.loaded_chunks.add(key)
+                for layer_index, layer in enumerate(self.layer_list):
+                    if key in self.source.directories[layer_index]:
+                        layer["grid"].add_chunk(key, self.source.read_chunk(layer_index, key))
+                self.collision_index.build_chunk(key, self.layer_list)
+                self.static_geometry.invalidate_chunk(key)
+                loaded.append(key)
+
+        # The extra chunk of margin stops chunks on the edge from being dropped and read again every frame
+        dropped = [key for key in self.loaded_chunks if max(abs(key[0] - center[0]), abs(key[1] - center[1])) > radius + 1]
+        for key in dropped:
+            self.loaded_chunks.discard(key)
+            for layer in self.layer_list:
+                layer["grid"].drop_chunk(key)
+            self.collision_index.drop_chunk(key)
+            self.static_geometry.invalidate_chunk(key)
+        return loaded, dropped
 
     def save(self):
-        level_dict = {"layer_list": self.layer_list, "background_list": self.background_list, "borders": self.borders}
-        file = open("levels/" + self.name, 'w')
-        json.dump(level_dict, file)
-        file.close()
+        # A streamed tilemap only holds the chunks around the player, writing it would lose the rest of the level
+        if self.streaming:
+            return
+        # Levels are written back in the format they were loaded from
+        if self.binary:
+            write_binary_level(self.path, self.layer_list, self.background_list, self.borders, self.player_spawn)
+        else:
+            self.export_json(self.path)
+
+    def export_json(self, path):
+        write_json_level(path, layers_to_level_dict(self.layer_list, self.background_list, self.borders, self.player_spawn))
 
     def load(self):
         try:
-            file = open("levels/" + self.name, 'r')
-            level_dict = json.load(file)
-            file.close()
-            return level_dict["layer_list"], level_dict["background_list"], level_dict["borders"]
+            return self.load_file(self.path)
         except FileNotFoundError:
-            file = open("levels/" + "clean_level", 'r')
-            level_dict = json.load(file)
-            file.close()
-            return level_dict["layer_list"], level_dict["background_list"], level_dict["borders"]
-
-
-        
-
-
-
-
-    
-    
-
-
-
-
-
-
+            return self.load_file("levels/" + "clean_level")
+
+    def load_file(self, path):
+        self.binary = is_binary_level(path)
+        if self.binary:
+            self.source = read_binary_level(path, self.streaming)
+            layer_list, self.player_spawn = self.source.load_layers(self.streaming)
+            return layer_list, self.source.meta["background_list"], self.source.meta["borders"]
+        self.streaming = False
+        level_dict = read_json_level(path)
+        layer_list, self.player_spawn = level_dict_to_layers(level_dict)
+        return layer_list, level_dict["background_list"], level_dict["borders"]